@@ -1,8 +1,9 @@
 import logging
 import asyncio
 from typing import List, Dict, Any, Optional
-from services.mildlyawesome.vector import VectorStore, DocumentChunk
+from services.mildlyawesome.vector import VectorStore, DocumentChunk, SearchHit
 from services.mildlyawesome.db import init_db
+from services.mildlyawesome.embeddings import embedder
 
 logger = logging.getLogger("emergent_api.vector_ops")
 
@@ -24,10 +25,8 @@ class VectorOps:
     async def ingest(self, text: str, meta: Dict[str, Any] = None) -> bool:
         """Ingest a single document into the vector store"""
         try:
-            # Placeholder embedding generation - rely on internal store logic if it handles it
-            # or use a dummy for now as seen in check_vector.py
-            embedding = [0.1] * 1536 
-            
+            embedding = (await embedder.embed_one(text)).tolist()
+
             await self.store.add_documents(
                 documents=[text],
                 embeddings=[embedding],
@@ -50,3 +49,12 @@ class VectorOps:
         except Exception as e:
             logger.error(f"Search failed: {e}")
             return []
+
+    async def search_many(self, query_vectors: List[List[float]], limit: int = 5,
+                          distance: Optional[str] = None) -> List[List[SearchHit]]:
+        """Batched semantic search: one round-trip, hits with distances per query"""
+        try:
+            return await self.store.search_many(query_vectors, limit=limit, distance=distance)
+        except Exception as e:
+            logger.error(f"Batch search failed: {e}")
+            return [[] for _ in query_vectors]
@@ -1,8 +1,8 @@
 
-from services.mildlyawesome.events import EventBus, event_bus
+from services.mildlyawesome.events import EventBus, BatchPublisher, RetentionPolicy, event_bus
 
 # Export EventBus for easier imports
-__all__ = ["EventBus", "event_bus"]
+__all__ = ["EventBus", "BatchPublisher", "RetentionPolicy", "event_bus"]
 
 # Lazy singleton accessible via imports
 event_bus = EventBus()
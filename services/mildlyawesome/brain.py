@@ -1,7 +1,10 @@
 
 from typing import List, Optional
 from pydantic import BaseModel
-from services.mildlyawesome.vector import VectorStore
+from services.mildlyawesome.vector import SearchHit, VectorStore
+from services.mildlyawesome.local_index import LocalVectorIndex, local_index
+from services.mildlyawesome.config import settings
+from services.mildlyawesome.embeddings import CachedEmbedder, embedder
 # from services.mildlyawesome.db import engine # Not directly used here yet
 import logging
 
@@ -13,32 +16,40 @@ class Thought(BaseModel):
     source_nodes: List[str]
 
 class BrainService:
-    def __init__(self):
+    def __init__(self, local: Optional[LocalVectorIndex] = None, embeddings: Optional[CachedEmbedder] = None):
         self.vector_store = VectorStore()
+        self.embedder = embeddings or embedder
+        self.local_index = local # Answers recall while ready; pgvector otherwise
+
+    @staticmethod
+    def _thought(hit: SearchHit, source: str) -> Thought:
+        # Similarity under the store's metric, clamped into [0, 1]
+        return Thought(
+            context=hit.chunk.content,
+            confidence=min(1.0, max(0.0, hit.similarity)),
+            source_nodes=[source]
+        )
 
     async def recall(self, query: str, limit: int = 5) -> List[Thought]:
         """
         Semantic recall using pgvector.
         Returns strictly typed Thoughts.
         """
+        results = await self.recall_many([query], limit=limit)
+        return results[0] if results else []
+
+    async def recall_many(self, queries: List[str], limit: int = 5) -> List[List[Thought]]:
+        """Recall for several queries in one database round-trip, one list per query"""
         try:
-            # Placeholder: In a real implementation, we'd generate an embedding for 'query' here.
-            # Using a zero-vector stub to prove connectivity to VectorStore.
-            dummy_embedding = [0.1] * 1536 
-            
-            results = await self.vector_store.search(dummy_embedding, limit=limit)
-            
-            thoughts = []
-            for doc in results:
-                thoughts.append(Thought(
-                    context=doc.content,
-                    confidence=0.9, 
-                    source_nodes=["pgvector"]
-                ))
-            return thoughts
+            embeddings = await self.embedder.embed(queries)
+            if self.local_index and self.local_index.ready:
+                results, source = await self.local_index.search_many(embeddings, limit=limit), "local"
+            else:
+                results, source = await self.vector_store.search_many(list(embeddings), limit=limit), "pgvector"
+            return [[self._thought(hit, source) for hit in hits] for hits in results]
         except Exception as e:
             logger.error(f"Brain recall failed: {e}")
-            return []
+            return [[] for _ in queries]
 
 # Singleton
-brain = BrainService()
+brain = BrainService(local_index if settings.vector_local_index else None)
@@ -0,0 +1,131 @@
+
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Optional
+from redis.asyncio import Redis
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger("mildlyawesome.bulkhead")
+
+QUEUE_WAIT = Histogram("bulkhead_queue_wait_seconds", "Time calls wait for a bulkhead slot", ["bulkhead"])
+IN_FLIGHT = Gauge("bulkhead_in_flight", "Calls holding a bulkhead slot in this process", ["bulkhead"])
+QUEUED = Gauge("bulkhead_queued", "Calls waiting for a bulkhead slot in this process", ["bulkhead"])
+REJECTED = Counter("bulkhead_rejected_total", "Calls rejected by a bulkhead", ["bulkhead", "reason"])
+
+class BulkheadFull(Exception):
+    pass
+
+class Bulkhead:
+    """
+    Caps in-flight calls to one dependency within this process.
+    Up to `max_queue` further callers wait at most `queue_timeout` seconds
+    for a slot; beyond that, or on timeout, BulkheadFull is raised.
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 10, max_queue: int = 100, queue_timeout: float = 30.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._in_flight = 0 # Holding a slot
+        self._waiting = 0 # Admitted, slot not yet granted
+
+    async def _acquire_slot(self, timeout: float) -> Optional[Any]:
+        """Return a slot handle for _release_slot, or None on timeout"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return None
+
+    async def _release_slot(self, slot: Any):
+        self._slots.release()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Hold one slot for the duration of the block"""
+        # Counted here, synchronously: callers arriving in the same tick must see each other,
+        # which the semaphore's own state doesn't show until its waiters have run
+        if self._in_flight + self._waiting >= self.max_concurrent + self.max_queue:
+            REJECTED.labels(self.name, "queue_full").inc()
+            raise BulkheadFull(f"Bulkhead {self.name} queue is full ({self.max_queue} waiting)")
+
+        self._waiting += 1
+        QUEUED.labels(self.name).inc()
+        start = time.perf_counter()
+        try:
+            slot = await self._acquire_slot(self.queue_timeout)
+        finally:
+            self._waiting -= 1
+            QUEUED.labels(self.name).dec()
+            QUEUE_WAIT.labels(self.name).observe(time.perf_counter() - start)
+        if slot is None:
+            REJECTED.labels(self.name, "timeout").inc()
+            raise BulkheadFull(f"Bulkhead {self.name}: no slot within {self.queue_timeout}s")
+
+        self._in_flight += 1
+        IN_FLIGHT.labels(self.name).inc()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            IN_FLIGHT.labels(self.name).dec()
+            await self._release_slot(slot)
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute function inside a bulkhead slot"""
+        async with self.acquire():
+            return await func(*args, **kwargs)
+
+# Take a lease if fewer than ARGV[2] live leases exist.
+# KEYS: lease zset   ARGV: now ms, limit, lease expiry ms, token
+TRY_LEASE = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[3]) - tonumber(ARGV[1]))
+    return 1
+end
+return 0
+"""
+
+class RedisBulkhead(Bulkhead):
+    """
+    Cluster-wide bulkhead: at most `max_concurrent` calls across all processes.
+    Slots are leases in a sorted set scored by expiry, so a crashed holder frees
+    its slot after `lease_timeout` seconds. Waiters retry with capped backoff;
+    the queue bound applies per process (max_concurrent + max_queue callers at once).
+    """
+
+    def __init__(self, redis: Redis, name: str, max_concurrent: int = 10, max_queue: int = 100,
+                 queue_timeout: float = 30.0, lease_timeout: float = 300.0):
+        super().__init__(name, max_concurrent, max_queue, queue_timeout)
+        self.redis = redis
+        self.key = f"bulkhead:{name}"
+        self.lease_timeout = lease_timeout
+        self._try_lease = redis.register_script(TRY_LEASE)
+
+    async def _acquire_slot(self, timeout: float) -> Optional[str]:
+        token = str(uuid.uuid4())
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            now_ms = int(time.time() * 1000)
+            if await self._try_lease(keys=[self.key], args=[now_ms, self.max_concurrent, now_ms + int(self.lease_timeout * 1000), token]):
+                return token
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    async def _release_slot(self, slot: str):
+        try:
+            await self.redis.zrem(self.key, slot)
+        except Exception as e:
+            # Lease expires on its own after lease_timeout
+            logger.warning(f"Bulkhead {self.name} lease release failed: {e}")
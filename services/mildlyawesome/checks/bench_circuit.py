@@ -0,0 +1,52 @@
+
+import asyncio
+import logging
+import os
+import time
+from redis.asyncio import Redis
+from services.mildlyawesome.circuit import CircuitBreaker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_circuit")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CALLS = int(os.getenv("BENCH_CALLS", "5000"))
+
+async def noop():
+    return None
+
+async def legacy_call(redis: Redis, name: str, func):
+    """Previous hot path: one GET on the open key per guarded call"""
+    if await redis.get(f"{name}:open"):
+        raise RuntimeError("open")
+    return await func()
+
+async def timed(label: str, call) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        await call()
+    per_call = (time.perf_counter() - start) / CALLS * 1e6
+    logger.info(f"{label:<28} {per_call:>9.2f} µs/call")
+    return per_call
+
+async def bench():
+    logger.info(f"--- Circuit breaker guarded-call overhead ({CALLS} calls) ---")
+    redis = Redis.from_url(REDIS_URL)
+    name = "bench-circuit"
+    await redis.delete(f"cb:{name}:failures", f"cb:{name}:open")
+    cb = CircuitBreaker(redis, name)
+
+    try:
+        base = await timed("unguarded", noop)
+        legacy = await timed("before (GET per call)", lambda: legacy_call(redis, cb.name, noop))
+        cached = await timed("after (local state cache)", lambda: cb.call(noop))
+        logger.info(f"Overhead: before {legacy - base:.2f} µs, after {cached - base:.2f} µs")
+    finally:
+        await redis.delete(f"cb:{name}:failures", f"cb:{name}:open")
+        await redis.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,77 @@
+
+import asyncio
+import logging
+import os
+import timeit
+from redis.asyncio import Redis
+from services.mildlyawesome.codec import CODECS, get_codec
+from services.mildlyawesome.events import EventBus
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_codecs")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EVENTS = int(os.getenv("BENCH_EVENTS", "1000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20000"))
+
+# Representative scraper payload: nested dicts, lists, numbers and short strings
+SAMPLE = {
+    "sku": "pop-mart--the-monsters--labubu--have-a-seat--blind-box--single--15cm",
+    "price": 89.0,
+    "currency": "CNY",
+    "in_stock": True,
+    "variants": [{"id": i, "name": f"variant-{i}", "weight": i * 0.25} for i in range(8)],
+    "tags": ["labubu", "blind-box", "restock"],
+}
+
+def bench_cpu(name: str):
+    """Encode/decode cost per payload in microseconds"""
+    codec = get_codec(name)
+    raw = codec.encode(SAMPLE)
+    enc = timeit.timeit(lambda: codec.encode(SAMPLE), number=ROUNDS) / ROUNDS * 1e6
+    dec = timeit.timeit(lambda: codec.decode(raw), number=ROUNDS) / ROUNDS * 1e6
+    return len(raw), enc, dec
+
+async def bench_memory(name: str, redis: Redis) -> float:
+    """Redis MEMORY USAGE per event for a stream of EVENTS entries"""
+    stream = f"bench:codec:{name}"
+    await redis.delete(stream)
+    bus = EventBus(REDIS_URL, codec=name)
+    await bus.connect()
+    try:
+        for offset in range(0, EVENTS, 500):
+            batch = [{"type": "BENCH", "payload": SAMPLE, "source": "bench"}] * min(500, EVENTS - offset)
+            await bus.publish_many(stream, batch)
+        usage = await redis.memory_usage(stream, samples=0)
+        return usage / EVENTS
+    finally:
+        await redis.delete(stream)
+        await bus.disconnect()
+
+async def bench():
+    logger.info(f"--- Payload codec benchmark ({ROUNDS} rounds, {EVENTS} events) ---")
+    redis = Redis.from_url(REDIS_URL)
+    try:
+        await redis.ping()
+    except Exception as e:
+        logger.warning(f"Redis unavailable, skipping memory measurement: {e}")
+        redis = None
+
+    logger.info(f"{'codec':<8} {'bytes':>6} {'enc µs':>8} {'dec µs':>8} {'redis B/evt':>12}")
+    for name in CODECS:
+        try:
+            size, enc, dec = bench_cpu(name)
+        except ImportError as e:
+            logger.info(f"{name:<8} skipped ({e})")
+            continue
+        memory = f"{await bench_memory(name, redis):.1f}" if redis else "-"
+        logger.info(f"{name:<8} {size:>6} {enc:>8.2f} {dec:>8.2f} {memory:>12}")
+
+    if redis:
+        await redis.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,72 @@
+
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from services.mildlyawesome.embeddings import CachedEmbedder, HashingEmbedder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_embeddings")
+
+DOCS = int(os.getenv("BENCH_DOCS", "5000"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "500"))
+K = int(os.getenv("BENCH_K", "5"))
+
+# Synthetic corpus: each topic has its own vocabulary, mixed with shared filler words
+TOPICS = {
+    "popmart": "labubu blind box figure series restock secret chase vinyl plush collector drop",
+    "cannabis": "strain terpene indica sativa dispensary potency cultivar harvest cure thc",
+    "pipeline": "deploy build artifact runner cache job stage rollback release container",
+    "resume": "experience skills education role employer project achievement reference degree",
+    "dayz": "server survivor loot zombie base raid map spawn weapon vehicle",
+}
+FILLER = "the a with for and new on from about of latest update report notes".split()
+
+rng = np.random.default_rng(0)
+
+def sentence(topic: str, words: int = 12) -> str:
+    vocab = TOPICS[topic].split()
+    picks = [vocab[i] for i in rng.integers(0, len(vocab), words // 2)] + [FILLER[i] for i in rng.integers(0, len(FILLER), words // 2)]
+    rng.shuffle(picks)
+    return " ".join(picks)
+
+names = list(TOPICS)
+doc_topics = [names[i] for i in rng.integers(0, len(names), DOCS)]
+docs = [sentence(t) for t in doc_topics]
+query_topics = [names[i] for i in rng.integers(0, len(names), QUERIES)]
+queries = [sentence(t, words=6) for t in query_topics]
+
+def precision_at_k(doc_vectors: np.ndarray, query_vectors: np.ndarray) -> float:
+    """Share of each query's top-K (cosine) from the query's own topic"""
+    scores = query_vectors @ doc_vectors.T
+    top = np.argpartition(-scores, K, axis=1)[:, :K]
+    labels = np.asarray(doc_topics)
+    return float(np.mean(labels[top] == np.asarray(query_topics)[:, None]))
+
+async def bench():
+    logger.info(f"--- Embedding benchmark ({DOCS} docs, {QUERIES} queries, offline) ---")
+    provider = HashingEmbedder()
+
+    start = time.perf_counter()
+    doc_vectors = provider.embed_sync(docs)
+    logger.info(f"{'hashing, raw':<24} {DOCS / (time.perf_counter() - start):10.0f} texts/s")
+
+    cached = CachedEmbedder(HashingEmbedder(), lru_size=DOCS * 2, use_redis=False)
+    for label in ("cached, cold", "cached, warm"):
+        start = time.perf_counter()
+        await cached.embed(docs)
+        logger.info(f"{label:<24} {DOCS / (time.perf_counter() - start):10.0f} texts/s")
+    logger.info(f"Cache counters: {cached.hits}")
+
+    query_vectors = provider.embed_sync(queries)
+    constant = np.full_like(doc_vectors, 0.1)
+    logger.info(f"precision@{K} hashing:  {precision_at_k(doc_vectors, query_vectors):.3f}")
+    logger.info(f"precision@{K} constant: {precision_at_k(constant, np.full_like(query_vectors, 0.1)):.3f} (previous stub)")
+    logger.info(f"precision@{K} chance:   {1 / len(TOPICS):.3f}")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,70 @@
+
+import asyncio
+import logging
+import os
+import statistics
+import time
+import numpy as np
+from sqlalchemy import delete
+from services.mildlyawesome.db import engine, init_db
+from services.mildlyawesome.local_index import LocalVectorIndex
+from services.mildlyawesome.vector import VectorStore, DocumentChunk
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_local_index")
+
+ROWS = int(os.getenv("BENCH_ROWS", "5000"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "200"))
+K = int(os.getenv("BENCH_K", "10"))
+DIM = 1536
+PREFIX = "bench-local-"
+
+async def timed(label: str, search):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        await search(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    logger.info(f"{label:<12} p50 {statistics.median(latencies):8.3f} ms   p99 {p99:8.3f} ms")
+
+rng = np.random.default_rng(0)
+corpus = rng.normal(size=(ROWS, DIM)).astype(np.float32)
+queries = rng.normal(size=(QUERIES, DIM)).astype(np.float32)
+
+async def cleanup():
+    async with engine.begin() as conn:
+        await conn.execute(delete(DocumentChunk).where(DocumentChunk.content.startswith(PREFIX)))
+
+async def bench():
+    logger.info(f"--- Local index vs pgvector ({ROWS} rows, k={K}) ---")
+    await init_db()
+    store = VectorStore(distance="l2", announce_changes=False)
+    try:
+        await cleanup()
+        await store.bulk_ingest(((f"{PREFIX}{i}", v, {"source": "bench"}) for i, v in enumerate(corpus)), method="copy")
+        index = LocalVectorIndex(distance="l2", max_rows=ROWS * 10)
+        await index.load()
+
+        # Same answers from both tiers (exact search on both sides)
+        local_ids = [hit.chunk.id for hit in await index.search(queries[0].tolist(), K)]
+        db_ids = [hit.chunk.id for hit in (await store.search_many([queries[0].tolist()], K))[0]]
+        logger.info(f"Top-{K} agreement on first query: {len(set(local_ids) & set(db_ids))}/{K}")
+
+        async def local(q):
+            return await index.search(q, K)
+
+        async def pgvector(q):
+            return await store.search(q.tolist(), K)
+
+        await timed("local", local)
+        await timed("pgvector", pgvector)
+    finally:
+        await cleanup()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,80 @@
+
+import asyncio
+import logging
+import os
+import statistics
+import time
+import httpx
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from services.mildlyawesome.events import event_bus
+from services.mildlyawesome.middleware import RateLimitMiddleware
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_ratelimit")
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "5000"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "50"))
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """Previous implementation: BaseHTTPMiddleware + INCR, then EXPIRE on first hit"""
+
+    def __init__(self, app, limit: int = 100, window: int = 60):
+        super().__init__(app)
+        self.limit = limit
+        self.window = window
+
+    async def dispatch(self, request: Request, call_next):
+        key = f"ratelimit:legacy:{request.client.host}"
+        current = await event_bus.redis.incr(key)
+        if current == 1:
+            await event_bus.redis.expire(key, self.window)
+        if current > self.limit:
+            return Response(content="Rate limit exceeded", status_code=429)
+        return await call_next(request)
+
+def build_app(middleware, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(middleware, **options)
+    return app
+
+async def run(label: str, app: FastAPI):
+    latencies = []
+    slots = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with slots:
+                start = time.perf_counter()
+                await client.get("/ping")
+                latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.gather(*[one() for _ in range(REQUESTS)])
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    logger.info(f"{label:<24} p50 {statistics.median(latencies):7.2f} ms   p99 {p99:7.2f} ms")
+
+async def bench():
+    logger.info(f"--- Rate limiter load benchmark ({REQUESTS} requests, {CONCURRENCY} concurrent) ---")
+    await event_bus.connect()
+    limit = REQUESTS * 2 # Measure the check itself, not 429s
+    try:
+        await run("legacy BaseHTTPMiddleware", build_app(LegacyRateLimitMiddleware, limit=limit, window=60))
+        await run("ASGI sliding window", build_app(RateLimitMiddleware, limit=limit, window=60))
+        await run("ASGI token bucket", build_app(RateLimitMiddleware, limit=limit, window=60, algorithm="token_bucket"))
+        await run("ASGI approximate local", build_app(RateLimitMiddleware, limit=limit, window=60, mode="approximate"))
+    finally:
+        for pattern in ("ratelimit:legacy:*", "ratelimit:ip:*"):
+            async for key in event_bus.redis.scan_iter(pattern):
+                await event_bus.redis.delete(key)
+        await event_bus.disconnect()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,53 @@
+
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from sqlalchemy import delete
+from services.mildlyawesome.db import engine, init_db
+from services.mildlyawesome.vector import VectorStore, DocumentChunk
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_vector_ingest")
+
+ROWS = int(os.getenv("BENCH_ROWS", "20000"))
+ORM_ROWS = int(os.getenv("BENCH_ORM_ROWS", "2000")) # The ORM path is too slow for the full set
+BATCH = int(os.getenv("BENCH_BATCH", "5000"))
+DIM = 1536
+PREFIX = "bench-ingest-"
+
+def rows(n: int):
+    """Generator, so bulk_ingest never sees the whole set at once"""
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        yield f"{PREFIX}{i}", rng.random(DIM, dtype=np.float32), {"source": "bench", "i": i}
+
+async def cleanup():
+    async with engine.begin() as conn:
+        await conn.execute(delete(DocumentChunk).where(DocumentChunk.content.startswith(PREFIX)))
+
+async def bench():
+    logger.info(f"--- Vector ingest benchmark ({ROWS} rows x {DIM} dims, batches of {BATCH}) ---")
+    await init_db()
+    store = VectorStore()
+    try:
+        await cleanup()
+        docs, embeddings, metas = zip(*rows(ORM_ROWS))
+        start = time.perf_counter()
+        await store.add_documents(list(docs), [e.tolist() for e in embeddings], list(metas))
+        elapsed = time.perf_counter() - start
+        logger.info(f"{'orm add_documents':<20} {ORM_ROWS / elapsed:10.0f} rows/s")
+
+        for method in ("executemany", "copy"):
+            await cleanup()
+            stats = await store.bulk_ingest(rows(ROWS), batch_size=BATCH, method=method)
+            logger.info(f"{method:<20} {stats.rows_per_second:10.0f} rows/s ({stats.batches} batches)")
+    finally:
+        await cleanup()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,73 @@
+
+import asyncio
+import logging
+import os
+import statistics
+import time
+import numpy as np
+from sqlalchemy import delete
+from services.mildlyawesome.db import engine, init_db
+from services.mildlyawesome.vector import VectorStore, DocumentChunk, IndexSpec, QUANTIZATIONS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_vector_quantization")
+
+ROWS = int(os.getenv("BENCH_ROWS", "20000"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "100"))
+K = int(os.getenv("BENCH_K", "10"))
+DISTANCE = os.getenv("BENCH_DISTANCE", "cosine") # Binary quantization tracks angular distance best
+DIM = 1536
+PREFIX = "bench-quant-"
+
+# Clustered, normalized data, so quantization loses about as much as it does on real embeddings
+rng = np.random.default_rng(0)
+centers = rng.normal(size=(64, DIM)).astype(np.float32)
+corpus = (centers[rng.integers(0, 64, ROWS)] + rng.normal(scale=0.3, size=(ROWS, DIM))).astype(np.float32)
+corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+queries = (centers[rng.integers(0, 64, QUERIES)] + rng.normal(scale=0.3, size=(QUERIES, DIM))).astype(np.float32)
+queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+def ground_truth() -> list:
+    """Exact top-K; all vectors are unit length, so cosine, ip and L2 agree"""
+    return [set(np.argpartition(-(corpus @ q), K)[:K].tolist()) for q in queries]
+
+async def measure(label: str, store: VectorStore, truth: list, index_bytes: int):
+    latencies, hits = [], 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = await store.search(q.tolist(), limit=K, ef_search=100)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & {int(doc.content[len(PREFIX):]) for doc in results})
+    logger.info(
+        f"{label:<10} index {index_bytes / 1e6:8.1f} MB   recall@{K} {hits / (K * len(truth)):.3f}   "
+        f"p50 {statistics.median(latencies):7.2f} ms"
+    )
+
+async def cleanup():
+    async with engine.begin() as conn:
+        await conn.execute(delete(DocumentChunk).where(DocumentChunk.content.startswith(PREFIX)))
+
+async def bench():
+    logger.info(f"--- Quantized storage benchmark ({ROWS} rows, {QUERIES} queries, k={K}, {DISTANCE}) ---")
+    await init_db()
+    truth = ground_truth()
+    specs = [IndexSpec("hnsw", DISTANCE, quantization=mode) for mode in QUANTIZATIONS]
+    try:
+        await cleanup()
+        await VectorStore().bulk_ingest(((f"{PREFIX}{i}", v, {"source": "bench"}) for i, v in enumerate(corpus)), method="copy")
+        for spec in specs:
+            store = VectorStore(distance=DISTANCE, quantization=spec.quantization)
+            await store.create_index(spec, maintenance_work_mem="1GB")
+            sizes = {status["name"]: status["size_bytes"] for status in await store.index_status()}
+            await measure(spec.quantization, store, truth, sizes.get(spec.name, 0))
+            await store.drop_index(spec) # One index at a time so the planner can't pick another
+    finally:
+        for spec in specs:
+            await VectorStore().drop_index(spec)
+        await cleanup()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(bench())
+    except KeyboardInterrupt:
+        pass
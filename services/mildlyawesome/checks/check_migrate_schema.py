@@ -0,0 +1,73 @@
+
+import asyncio
+import logging
+from sqlalchemy import text
+from services.mildlyawesome.db import engine
+from services.mildlyawesome.vector import TABLE, migrate_schema
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("check_migrate_schema")
+
+SCHEMA = "check_migrate"
+# DDL SQLModel emitted for the original model (metadata_json: str = "{}"), rows as the original add_documents wrote them
+LEGACY_TABLE = f"""
+CREATE TABLE {TABLE} (
+    id SERIAL NOT NULL,
+    content VARCHAR NOT NULL,
+    metadata_json VARCHAR NOT NULL,
+    embedding VECTOR(1536),
+    PRIMARY KEY (id)
+)
+"""
+LEGACY_ROWS = [
+    ("popmart drop", "{'source': 'popmart', 'series': 3}"),
+    ("json row", '{"source": "json"}'),
+    ("empty", "{}"),
+]
+
+async def check():
+    logger.info("--- Schema migration verification (legacy VARCHAR metadata table) ---")
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    try:
+        async with engine.begin() as conn:
+            # Scratch schema first, public after it for the vector type
+            await conn.execute(text(f"SET LOCAL search_path TO {SCHEMA}, public"))
+            await conn.execute(text(LEGACY_TABLE))
+            await conn.execute(text(f"INSERT INTO {TABLE} (content, metadata_json) VALUES (:content, :meta)"),
+                               [{"content": content, "meta": meta} for content, meta in LEGACY_ROWS])
+            await migrate_schema(conn)
+            await migrate_schema(conn) # Must be idempotent
+
+            column_type = (await conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_schema = :schema AND table_name = :table AND column_name = 'metadata_json'"
+            ), {"schema": SCHEMA, "table": TABLE})).scalar()
+            if column_type != "jsonb":
+                logger.error(f"❌ metadata_json is {column_type}, expected jsonb")
+                exit(1)
+            matched = (await conn.execute(text(
+                f"SELECT content FROM {TABLE} WHERE metadata_json @> CAST(:filter AS jsonb)"
+            ), {"filter": '{"source": "popmart"}'})).scalars().all()
+            if matched != ["popmart drop"]:
+                logger.error(f"❌ Containment filter on migrated rows returned {matched}")
+                exit(1)
+            indexes = set((await conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = :table"
+            ), {"schema": SCHEMA, "table": TABLE})).scalars())
+            missing = {f"{TABLE}_metadata_gin", f"{TABLE}_content_tsv_gin"} - indexes
+            if missing:
+                logger.error(f"❌ Missing indexes after migration: {missing}")
+                exit(1)
+        logger.info("✅ Legacy table migrated: metadata_json is jsonb, repr rows parsed, GIN indexes present")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(check())
+    except KeyboardInterrupt:
+        pass
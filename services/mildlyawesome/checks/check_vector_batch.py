@@ -0,0 +1,56 @@
+
+import asyncio
+import logging
+from sqlalchemy import delete
+from services.mildlyawesome.brain import BrainService
+from services.mildlyawesome.db import engine, init_db
+from services.mildlyawesome.embeddings import embedder
+from services.mildlyawesome.vector import VectorStore, DocumentChunk
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("check_vector_batch")
+
+PREFIX = "check-batch-"
+DOCS = [
+    f"{PREFIX}labubu blind box restock at the popmart store",
+    f"{PREFIX}indica strain terpene profile and potency report",
+    f"{PREFIX}deploy pipeline rollback after a failed release",
+]
+
+async def cleanup():
+    async with engine.begin() as conn:
+        await conn.execute(delete(DocumentChunk).where(DocumentChunk.content.startswith(PREFIX)))
+
+async def check():
+    logger.info("--- Batched vector search verification (search_many, recall) ---")
+    await init_db()
+    store = VectorStore(announce_changes=False)
+    try:
+        await cleanup()
+        embeddings = await embedder.embed(DOCS)
+        ids = await store.add_documents(DOCS, [e.tolist() for e in embeddings], [{"source": "check"}] * len(DOCS))
+
+        # Each document's own embedding must come back first for its query
+        hits = await store.search_many(embeddings, limit=3, metadata_filter={"source": "check"})
+        for doc_id, doc, results in zip(ids, DOCS, hits):
+            if not results or results[0].chunk.id != doc_id:
+                logger.error(f"❌ search_many: expected {doc!r} first, got {[hit.chunk.content for hit in results]}")
+                exit(1)
+        logger.info(f"✅ search_many returned the right top hit for {len(DOCS)} queries in one round-trip")
+
+        # pgvector path only: recall swallows query errors into [], so compare with search_many directly
+        query = "labubu restock"
+        expected = [hit.chunk.content for hit in (await store.search_many(await embedder.embed([query]), limit=3))[0]]
+        thoughts = await BrainService().recall(query, limit=3)
+        if not thoughts or [t.context for t in thoughts] != expected:
+            logger.error(f"❌ recall: expected {expected}, got {[t.context for t in thoughts]}")
+            exit(1)
+        logger.info(f"✅ recall returned {len(thoughts)} thoughts, top: {thoughts[0].context} (confidence {thoughts[0].confidence:.2f})")
+    finally:
+        await cleanup()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(check())
+    except KeyboardInterrupt:
+        pass
@@ -23,12 +23,13 @@ async def verify():
         
         # Verify read
         # Using a raw redis command to peek
-        messages = await event_bus.redis.xrange(stream_key, count=1)
+        messages = await event_bus.redis.xrevrange(stream_key, count=1) # Newest entry: the one just published
         if messages:
             msg_id_read, msg_data = messages[0]
-            # msg_data is a dict of strings. 'payload' is json string.
+            # The bus reads raw bytes; decode the entry the way consumers see it
+            msg_data = event_bus._decode_message(msg_data, stream_key)
             logger.info(f"✅ Verified event in stream: {msg_data}")
-            assert msg_id_read == msg_id
+            assert msg_id_read.decode() == msg_id
             assert msg_data['type'] == event_type
         else:
             logger.error("❌ Event not found in stream!")
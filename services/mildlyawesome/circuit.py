@@ -1,41 +1,344 @@
 
+import asyncio
 import logging
+import time
+import weakref
 from redis.asyncio import Redis
-from typing import Callable, Any
+from typing import Callable, Any, Dict, List, Optional, Set
 from functools import wraps
+from prometheus_client import Histogram
+from services.mildlyawesome.bulkhead import Bulkhead
 
 logger = logging.getLogger("mildlyawesome.circuit")
 
+# Channel on which breaker trips are announced as "<key>|<open ms>"
+TRIP_CHANNEL = "cb:trips"
+
+# Failure accounting + open transition in one round-trip.
+# KEYS: failures, open   ARGV: threshold, recovery_timeout (s), channel
+# Returns remaining open time in ms (0 while still closed).
+RECORD_FAILURE = """
+local open_ttl = redis.call('PTTL', KEYS[2])
+if open_ttl > 0 then
+    return open_ttl
+end
+local failures = redis.call('INCR', KEYS[1])
+if failures >= tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[2], '1', 'EX', ARGV[2])
+    redis.call('DEL', KEYS[1])
+    local ms = tonumber(ARGV[2]) * 1000
+    redis.call('PUBLISH', ARGV[3], KEYS[2] .. '|' .. ms)
+    return ms
+end
+return 0
+"""
+
+# Breakers in this process by key, so trip announcements can update their caches
+_breakers: "weakref.WeakValueDictionary[str, CircuitBreaker]" = weakref.WeakValueDictionary()
+
 class CircuitBreakerOpen(Exception):
     pass
 
 class CircuitBreaker:
-    def __init__(self, redis: Redis, name: str, threshold: int = 5, recovery_timeout: int = 30):
+    """
+    Redis-backed circuit breaker shared across processes.
+    State is cached locally: a closed breaker is re-checked at most every
+    `cache_ttl` seconds, an open one not until it is due to close, so the
+    closed hot path makes no Redis calls. Trips elsewhere reach this process
+    within `cache_ttl`, or immediately when listen_for_trips is running.
+    """
+
+    def __init__(self, redis: Redis, name: str, threshold: int = 5, recovery_timeout: int = 30, cache_ttl: float = 1.0):
         self.redis = redis
         self.name = f"cb:{name}"
         self.threshold = threshold
         self.recovery_timeout = recovery_timeout
+        self.cache_ttl = cache_ttl
+        self._record_failure = redis.register_script(RECORD_FAILURE)
+        self._open_until = 0.0 # monotonic deadline while open
+        self._checked_until = 0.0 # closed state trusted until this monotonic time
+        _breakers[f"{self.name}:open"] = self
+
+    def _set_open(self, ms: int):
+        now = time.monotonic()
+        self._open_until = now + ms / 1000
+        self._checked_until = self._open_until
+
+    async def _is_open(self) -> bool:
+        now = time.monotonic()
+        if now < self._open_until:
+            return True
+        if now < self._checked_until:
+            return False
+        ttl = await self.redis.pttl(f"{self.name}:open")
+        if ttl > 0:
+            self._set_open(ttl)
+            return True
+        self._checked_until = now + self.cache_ttl
+        return False
 
     async def call(self, func: Callable, *args, **kwargs) -> Any:
         """Execute function with circuit breaker protection"""
-        
+
         # Check if open
-        is_open = await self.redis.get(f"{self.name}:open")
-        if is_open:
+        if await self._is_open():
             logger.warning(f"Circuit {self.name} is OPEN. Failing fast.")
             raise CircuitBreakerOpen(f"Circuit {self.name} is open")
 
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            # Failure -> Increment, and open atomically once the threshold is reached
+            open_ms = await self._record_failure(
+                keys=[f"{self.name}:failures", f"{self.name}:open"],
+                args=[self.threshold, self.recovery_timeout, TRIP_CHANNEL]
+            )
+            if open_ms:
+                logger.error(f"Circuit {self.name} reached threshold ({self.threshold}). Opening for {self.recovery_timeout}s.")
+                self._set_open(int(open_ms))
+            raise e
+
+async def listen_for_trips(redis: Redis):
+    """
+    Push breaker trips from any process into this process's local caches.
+    Run as a background task; without it caches converge within cache_ttl.
+    """
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(TRIP_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            data = message["data"]
+            key, _, ms = (data.decode() if isinstance(data, bytes) else data).rpartition("|")
+            breaker = _breakers.get(key)
+            if breaker:
+                breaker._set_open(int(ms))
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await pubsub.close()
+
+CALL_LATENCY = Histogram(
+    "circuit_breaker_call_seconds", "Latency of calls guarded by a circuit breaker", ["breaker", "outcome"]
+)
+
+# Admission check while the local cache can't vouch for a closed breaker.
+# KEYS: open, probes   Returns {state, open ms}: 0 closed, 1 probe granted, -1 open, -2 probes exhausted
+ACQUIRE = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    return {-1, ttl}
+end
+local probes = redis.call('GET', KEYS[2])
+if not probes then
+    return {0, 0}
+end
+if tonumber(probes) > 0 then
+    redis.call('DECR', KEYS[2])
+    return {1, 0}
+end
+return {-2, 0}
+"""
+
+# Record outcomes and apply state transitions.
+# KEYS: window hash, open, probes, probe successes
+# ARGV: now (s), window (s), kind, min_calls, failure_rate, slow_rate, recovery_timeout (s),
+#       half_open_calls, channel, then (second, calls, failures, slows) per bucket
+# kind: "window" for aggregated closed-state outcomes, "probe" for one half-open probe
+# (a single bucket), "release" to hand back the slot of a cancelled probe (no buckets).
+# Returns open ms if these outcomes opened the breaker, else 0.
+RECORD_OUTCOME = """
+local now, window, kind = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+local recovery_ms = tonumber(ARGV[7]) * 1000
+
+local function trip()
+    redis.call('SET', KEYS[2], '1', 'PX', recovery_ms)
+    redis.call('SET', KEYS[3], ARGV[8], 'PX', recovery_ms * 2) -- Lost probes can't wedge it half-open
+    redis.call('DEL', KEYS[1], KEYS[4])
+    redis.call('PUBLISH', ARGV[9], KEYS[2] .. '|' .. recovery_ms)
+    return recovery_ms
+end
+
+if kind == 'release' then
+    if redis.call('EXISTS', KEYS[3]) == 1 then redis.call('INCR', KEYS[3]) end
+    return 0
+end
+
+if kind == 'probe' then
+    if tonumber(ARGV[12]) > 0 or tonumber(ARGV[13]) > 0 then
+        return trip()
+    end
+    if redis.call('INCR', KEYS[4]) >= tonumber(ARGV[8]) then
+        redis.call('DEL', KEYS[3], KEYS[4], KEYS[1]) -- Recovered: close with a fresh window
+    end
+    return 0
+end
+
+for i = 10, #ARGV, 4 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i] .. ':c', ARGV[i + 1])
+    if tonumber(ARGV[i + 2]) > 0 then redis.call('HINCRBY', KEYS[1], ARGV[i] .. ':f', ARGV[i + 2]) end
+    if tonumber(ARGV[i + 3]) > 0 then redis.call('HINCRBY', KEYS[1], ARGV[i] .. ':s', ARGV[i + 3]) end
+end
+redis.call('EXPIRE', KEYS[1], window * 2)
+
+local calls, failures, slows = 0, 0, 0
+local fields = redis.call('HGETALL', KEYS[1])
+for i = 1, #fields, 2 do
+    local sec, field = string.match(fields[i], '(%d+):(%a)')
+    if tonumber(sec) <= now - window then
+        redis.call('HDEL', KEYS[1], fields[i])
+    elseif field == 'c' then calls = calls + tonumber(fields[i + 1])
+    elseif field == 'f' then failures = failures + tonumber(fields[i + 1])
+    else slows = slows + tonumber(fields[i + 1]) end
+end
+
+if calls >= tonumber(ARGV[4]) and redis.call('EXISTS', KEYS[2]) == 0 and
+   (failures / calls >= tonumber(ARGV[5]) or slows / calls >= tonumber(ARGV[6])) then
+    return trip()
+end
+return 0
+"""
+
+class SlidingWindowCircuitBreaker:
+    """
+    Circuit breaker that trips on failure rate or slow-call rate over a rolling
+    time window, once at least `min_calls` calls fall inside it.
+    After `recovery_timeout` it goes half-open: `half_open_calls` probes are let
+    through across all processes; that many successes close it, any failure or
+    slow probe re-opens it. Closed state is cached locally like CircuitBreaker.
+    Closed-state outcomes are counted locally and pushed at most every
+    `flush_interval` seconds, off the caller's path, so a trip can lag by about
+    that long. Probe outcomes are sent right away, also without blocking the caller.
+    Cancelled calls say nothing about the upstream: they are not counted, and a
+    cancelled probe hands its slot back.
+    Latencies go to the circuit_breaker_call_seconds histogram.
+    """
+
+    def __init__(self, redis: Redis, name: str, window: int = 60, min_calls: int = 20,
+                 failure_rate: float = 0.5, slow_call_rate: float = 0.5, slow_call_duration: float = 5.0,
+                 recovery_timeout: int = 30, half_open_calls: int = 3, cache_ttl: float = 1.0,
+                 flush_interval: float = 1.0):
+        self.redis = redis
+        self.name = f"cb:{name}"
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_duration = slow_call_duration
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self._keys = [f"{self.name}:window", f"{self.name}:open", f"{self.name}:probes", f"{self.name}:probe_ok"]
+        self._acquire = redis.register_script(ACQUIRE)
+        self._record = redis.register_script(RECORD_OUTCOME)
+        self._open_until = 0.0
+        self._checked_until = 0.0
+        self._outcomes: Dict[int, List[int]] = {} # epoch second -> [calls, failures, slows] not yet pushed
+        self._flush_due = 0.0
+        self._flushing: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set() # Probe reports in flight
+        _breakers[f"{self.name}:open"] = self
+
+    def _set_open(self, ms: int):
+        now = time.monotonic()
+        self._open_until = now + ms / 1000
+        self._checked_until = 0.0 # Re-check (and possibly probe) once it expires
+
+    async def _admit(self) -> bool:
+        """True if this call is a half-open probe. Raises CircuitBreakerOpen if rejected."""
+        now = time.monotonic()
+        if now < self._open_until:
+            raise CircuitBreakerOpen(f"Circuit {self.name} is open")
+        if now < self._checked_until:
+            return False
+        state, ttl = await self._acquire(keys=self._keys[1:3])
+        if state == -1:
+            self._set_open(ttl)
+            raise CircuitBreakerOpen(f"Circuit {self.name} is open")
+        if state == -2:
+            raise CircuitBreakerOpen(f"Circuit {self.name} is half-open, probes in flight")
+        if state == 0:
+            self._checked_until = now + self.cache_ttl
+        return state == 1
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute function with circuit breaker protection"""
+        try:
+            probe = await self._admit()
+        except CircuitBreakerOpen:
+            logger.warning(f"Circuit {self.name} rejected call. Failing fast.")
+            raise
+
+        start = time.perf_counter()
+        outcome = "cancelled" # Until func returns or raises; CancelledError skips `except Exception`
         try:
             result = await func(*args, **kwargs)
-            # Success -> Reset count
-            # await self.redis.delete(f"{self.name}:failures") # Optional: aggressive reset
+            outcome = "success"
             return result
+        except Exception:
+            outcome = "failure"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            slow = elapsed >= self.slow_call_duration
+            CALL_LATENCY.labels(self.name, "slow" if outcome == "success" and slow else outcome).observe(elapsed)
+            self._note(outcome, slow, probe)
+
+    def _note(self, outcome: str, slow: bool, probe: bool):
+        """Queue one outcome for Redis without waiting on it"""
+        if probe:
+            if outcome == "cancelled":
+                task = asyncio.create_task(self._send("release", []))
+            else:
+                task = asyncio.create_task(self._send("probe", [int(time.time()), 1, int(outcome == "failure"), int(slow)]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return
+        if outcome == "cancelled":
+            return
+        counts = self._outcomes.setdefault(int(time.time()), [0, 0, 0])
+        counts[0] += 1
+        counts[1] += outcome == "failure"
+        counts[2] += slow
+        if not self._flushing and time.monotonic() >= self._flush_due:
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Push the locally counted outcomes in one script call"""
+        try:
+            outcomes, self._outcomes = self._outcomes, {}
+            self._flush_due = time.monotonic() + self.flush_interval
+            if outcomes:
+                await self._send("window", [value for second, counts in sorted(outcomes.items()) for value in (second, *counts)])
+        finally:
+            self._flushing = None
+
+    async def _send(self, kind: str, buckets: List[int]):
+        try:
+            open_ms = await self._record(keys=self._keys, args=[
+                int(time.time()), self.window, kind, self.min_calls, self.failure_rate, self.slow_call_rate,
+                self.recovery_timeout, self.half_open_calls, TRIP_CHANNEL, *buckets
+            ])
+            if open_ms:
+                logger.error(f"Circuit {self.name} tripped ({kind}). Opening for {self.recovery_timeout}s.")
+                self._set_open(int(open_ms))
         except Exception as e:
-            # Failure -> Increment
-            failures = await self.redis.incr(f"{self.name}:failures")
-            if failures >= self.threshold:
-                # Open circuit
-                logger.error(f"Circuit {self.name} reached threshold ({failures}). Opening for {self.recovery_timeout}s.")
-                await self.redis.setex(f"{self.name}:open", self.recovery_timeout, "1")
-                await self.redis.delete(f"{self.name}:failures") # Reset failures for next cycle
-            raise e
+            logger.error(f"Circuit {self.name} failed to record outcome: {e}")
+
+def protected(breaker: Any = None, bulkhead: Optional[Bulkhead] = None):
+    """
+    Decorator guarding a coroutine function with a bulkhead and/or circuit breaker.
+    The bulkhead is outermost, so BulkheadFull rejections never count as
+    upstream failures, and an open breaker frees slots immediately.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            target = (lambda: breaker.call(func, *args, **kwargs)) if breaker else (lambda: func(*args, **kwargs))
+            if bulkhead:
+                return await bulkhead.call(target)
+            return await target()
+        return wrapper
+    return decorator
@@ -0,0 +1,84 @@
+
+import json
+from typing import Any, Dict, Union
+
+try:
+    import orjson
+except ImportError: # Optional: only needed for the "orjson" codec
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # Optional: only needed for the "msgpack" codec
+    msgpack = None
+
+class PayloadCodec:
+    """
+    Encodes event payloads for storage in a Redis Stream field.
+    `binary` codecs need a connection with decode_responses=False.
+    """
+    name: str = ""
+    binary: bool = False
+
+    def encode(self, payload: Any) -> Union[str, bytes]:
+        raise NotImplementedError
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        raise NotImplementedError
+
+class JsonCodec(PayloadCodec):
+    name = "json"
+
+    def encode(self, payload: Any) -> str:
+        return json.dumps(payload)
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        return json.loads(raw)
+
+class OrjsonCodec(PayloadCodec):
+    """orjson output is valid JSON, so stdlib consumers can still read it"""
+    name = "orjson"
+    binary = True
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson codec requires the 'orjson' package")
+
+    def encode(self, payload: Any) -> bytes:
+        return orjson.dumps(payload)
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        return orjson.loads(raw)
+
+class MsgpackCodec(PayloadCodec):
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("msgpack codec requires the 'msgpack' package")
+
+    def encode(self, payload: Any) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        return msgpack.unpackb(raw, raw=False)
+
+CODECS: Dict[str, type] = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+_instances: Dict[str, PayloadCodec] = {}
+
+def get_codec(codec: Union[str, PayloadCodec, None] = None) -> PayloadCodec:
+    """Resolve a codec name (or instance) to a shared codec instance"""
+    if isinstance(codec, PayloadCodec):
+        return codec
+    name = codec or JsonCodec.name
+    if name not in _instances:
+        if name not in CODECS:
+            raise ValueError(f"Unknown payload codec: {name}")
+        _instances[name] = CODECS[name]()
+    return _instances[name]
@@ -18,6 +18,37 @@ class Settings(BaseSettings):
     # Feature Flags
     enable_brain: bool = True
     enable_worker: bool = True
+    event_local_delivery: bool = False # Deliver same-process events via asyncio queues before Redis
+    event_outbox_size: int = 0 # >0 buffers publishes in memory while Redis is slow or down
+    event_outbox_overflow: str = "drop_oldest" # block | drop_oldest | spill
+    event_outbox_spill_path: str = "/tmp/effusion-event-outbox.jsonl"
+    rate_limit_mode: str = "exact" # exact | approximate (local counting, synced to Redis)
+    rate_limit_max_overshoot: int = 10 # approximate: requests per window a key may exceed its limit by
+    rate_limit_replicas: int = 1 # approximate: replicas sharing the overshoot budget
+
+    # Redis connection pools (see redis_pools.py)
+    redis_pool_bus_size: int = 20 # Streams; each blocking XREADGROUP holds a connection
+    redis_pool_ratelimit_size: int = 50
+    redis_pool_locks_size: int = 20 # Includes one pub/sub connection per waiting lock
+    redis_pool_cache_size: int = 20
+
+    # Process pool for CPU-bound handlers (see offload.py), per replica
+    offload_workers: int = 2 # 0 = cpu_count - 1
+    offload_preload: bool = False # Spawn all workers at startup with pandas/matplotlib/seaborn and handler modules imported
+
+    # Vector search
+    vector_index: str = "" # hnsw | ivfflat: built concurrently at startup if missing
+    vector_index_distance: str = "l2" # l2 | cosine | ip
+    vector_quantization: str = "none" # none | halfvec | binary (compact index + exact re-rank)
+    vector_rerank_factor: int = 4 # quantized: candidates fetched per result before re-ranking
+    vector_local_index: bool = False # Serve recall from an in-process NumPy index; writers announce changes
+    vector_local_index_max_rows: int = 50000 # Larger tables stay on pgvector only
+    vector_local_index_snapshot: str = "" # Path prefix for memory-mapped snapshots, e.g. /tmp/effusion-vectors
+
+    # Embeddings (see embeddings.py)
+    embedding_provider: str = "hashing" # Offline, deterministic
+    embedding_cache_size: int = 10000 # In-process LRU entries
+    embedding_cache_ttl: int = 604800 # Redis cache seconds; 0 keeps entries until evicted
 
     class Config:
         env_file = ".env"
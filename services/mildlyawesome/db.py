@@ -21,6 +21,9 @@ async def init_db():
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         # await conn.run_sync(SQLModel.metadata.drop_all) # Uncomment to reset
         await conn.run_sync(SQLModel.metadata.create_all)
+        # JSONB metadata, full-text column and their indexes on older tables
+        from services.mildlyawesome.vector import migrate_schema
+        await migrate_schema(conn)
     logger.info("Database initialized.")
 
 async def get_session() -> AsyncSession:
@@ -0,0 +1,182 @@
+
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from services.mildlyawesome.config import settings
+from services.mildlyawesome.vector import DIM
+
+logger = logging.getLogger("mildlyawesome.embeddings")
+
+class EmbeddingProvider:
+    """
+    Turns texts into float32 vectors of `dim`, one row per text.
+    `name` must change whenever outputs would, since caches key on it.
+    Remote providers implement embed(); local ones can implement embed_sync()
+    and inherit an embed() that moves big batches off the event loop.
+    """
+    name: str = ""
+    dim: int = DIM
+    batch_size: int = 256 # Texts per provider call
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if len(texts) <= 32:
+            return self.embed_sync(texts)
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+_TOKEN = re.compile(r"\w+")
+
+class HashingEmbedder(EmbeddingProvider):
+    """
+    Offline, deterministic embeddings by signed feature hashing: word n-grams
+    plus character n-grams within words, hashed with blake2b (stable across
+    processes, unlike hash()), sublinear term frequency, L2-normalized.
+    Captures lexical overlap, not meaning; enough for meaningful recall without an API.
+    """
+
+    def __init__(self, dim: int = DIM, word_ngrams: int = 2, char_ngrams: int = 3):
+        self.dim = dim
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.name = f"hashing-v1-{dim}-w{word_ngrams}-c{char_ngrams}"
+        self._feature_cache: Dict[str, int] = {} # feature -> signed bucket; vocabularies are small
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN.findall(text.lower())
+        features = []
+        for n in range(1, self.word_ngrams + 1):
+            features.extend("w:" + " ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+        if self.char_ngrams:
+            for word in words:
+                padded = f"<{word}>"
+                features.extend("c:" + padded[i:i + self.char_ngrams] for i in range(len(padded) - self.char_ngrams + 1))
+        return features
+
+    def _bucket(self, feature: str) -> int:
+        """Signed bucket: abs() - 1 is the index, the sign is the hash sign"""
+        bucket = self._feature_cache.get(feature)
+        if bucket is None:
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            bucket = (h % self.dim + 1) * (1 if h >> 63 else -1)
+            if len(self._feature_cache) < 1_000_000:
+                self._feature_cache[feature] = bucket
+        return bucket
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        rows, buckets = [], []
+        for row, text in enumerate(texts):
+            features = [self._bucket(f) for f in self._features(text)]
+            rows.extend([row] * len(features))
+            buckets.extend(features)
+        buckets = np.asarray(buckets, dtype=np.int64)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.int64), np.abs(buckets) - 1), np.sign(buckets).astype(np.float32))
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix)) # Sublinear tf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+PROVIDERS: Dict[str, type] = {
+    "hashing": HashingEmbedder,
+}
+
+def get_provider(name: str) -> EmbeddingProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    return PROVIDERS[name]()
+
+class CachedEmbedder:
+    """
+    Front for a provider: repeated texts are never re-embedded.
+    Lookups go in-process LRU -> Redis ("cache" pool, raw float32 bytes, keyed
+    by provider name + sha256 of the text) -> provider, in batches of
+    provider.batch_size, with duplicates in a call embedded once.
+    Redis problems only cost cache hits.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, lru_size: int = 10000, redis_ttl: Optional[int] = 604800,
+                 use_redis: bool = True):
+        self.provider = provider
+        self.lru_size = lru_size
+        self.redis_ttl = redis_ttl
+        self.use_redis = use_redis
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = {"lru": 0, "redis": 0, "computed": 0}
+
+    def _key(self, text: str) -> str:
+        return f"emb:{self.provider.name}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dim) float32, rows in input order"""
+        keys = [self._key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        for key in keys:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                found[key] = self._lru[key]
+        self.hits["lru"] += len(found)
+
+        pending = list(dict.fromkeys(k for k in keys if k not in found)) # Unique, order kept
+        if pending and self.use_redis:
+            found.update(await self._redis_get(pending))
+            pending = [k for k in pending if k not in found]
+
+        if pending:
+            text_of = dict(zip(keys, texts))
+            computed: Dict[str, np.ndarray] = {}
+            for i in range(0, len(pending), self.provider.batch_size):
+                batch = pending[i:i + self.provider.batch_size]
+                vectors = await self.provider.embed([text_of[k] for k in batch])
+                computed.update(zip(batch, vectors))
+            self.hits["computed"] += len(computed)
+            found.update(computed)
+            for key, vector in computed.items():
+                self._remember(key, vector)
+            if self.use_redis:
+                await self._redis_set(computed)
+
+        return np.stack([found[key] for key in keys]) if keys else np.empty((0, self.provider.dim), dtype=np.float32)
+
+    async def embed_one(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+    async def _redis_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            from services.mildlyawesome.redis_pools import redis_pools
+            values = await redis_pools.get("cache").mget(keys)
+        except Exception as e:
+            logger.debug(f"Embedding cache read skipped: {e}")
+            return {}
+        found = {key: np.frombuffer(value, dtype=np.float32) for key, value in zip(keys, values) if value}
+        self.hits["redis"] += len(found)
+        for key, vector in found.items():
+            self._remember(key, vector)
+        return found
+
+    async def _redis_set(self, vectors: Dict[str, np.ndarray]):
+        try:
+            from services.mildlyawesome.redis_pools import redis_pools
+            async with redis_pools.get("cache").pipeline(transaction=False) as pipe:
+                for key, vector in vectors.items():
+                    pipe.set(key, np.asarray(vector, dtype=np.float32).tobytes(), ex=self.redis_ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Embedding cache write skipped: {e}")
+
+# Global instance
+embedder = CachedEmbedder(
+    get_provider(settings.embedding_provider),
+    lru_size=settings.embedding_cache_size,
+    redis_ttl=settings.embedding_cache_ttl or None,
+)
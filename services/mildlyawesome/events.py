@@ -1,67 +1,401 @@
 
 import logging
-import json
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Set, Tuple, Union
 import asyncio
 from redis import asyncio as aioredis
 from redis.asyncio import Redis
 from services.mildlyawesome.config import settings
+from services.mildlyawesome.codec import PayloadCodec, get_codec
+from services.mildlyawesome.outbox import Outbox
+from services.mildlyawesome.redis_pools import redis_pools
 
 logger = logging.getLogger("event_bus")
 
+def _text(value: Any) -> Any:
+    """The bus reads with decode_responses=False, so IDs and field names arrive as bytes"""
+    return value.decode() if isinstance(value, bytes) else value
+
+class LocalDeliveryPending(Exception):
+    """Another process is still handling this event on its fast path; leave the entry pending"""
+
+def _stream_list(stream: Union[str, List[str]]) -> List[str]:
+    return [stream] if isinstance(stream, str) else list(stream)
+
+class RetentionPolicy:
+    """
+    How a stream is trimmed.
+    max_len: Cap on entries, applied on every XADD. Approximate (MAXLEN ~) by
+    default so Redis only trims whole radix-tree nodes.
+    max_age: Seconds of history to keep, enforced by the background trimmer
+    with XTRIM MINID rather than on the write path.
+    Neither set: the stream is never trimmed.
+    """
+    
+    def __init__(self, max_len: Optional[int] = None, max_age: Optional[float] = None, approximate: bool = True):
+        self.max_len = max_len
+        self.max_age = max_age
+        self.approximate = approximate
+        
+    def xadd_args(self) -> Dict[str, Any]:
+        if self.max_len is None:
+            return {}
+        return {"maxlen": self.max_len, "approximate": self.approximate}
+        
+    def min_id(self) -> Optional[str]:
+        """Oldest stream ID to keep under max_age (IDs start with a ms timestamp)"""
+        if self.max_age is None:
+            return None
+        return f"{int((time.time() - self.max_age) * 1000)}-0"
+        
+    def __repr__(self):
+        return f"RetentionPolicy(max_len={self.max_len}, max_age={self.max_age}, approximate={self.approximate})"
+
 class EventBus:
     """
     Centralized Event Bus using Redis Streams.
     Allows services to publish events and subscribe to interest groups.
+    With local_delivery, in-process subscribers get events straight from an
+    asyncio queue and Redis is written in the background for durability.
+    The Redis copy carries an "origin" field and a local_events:<id> marker
+    (running -> done, deleted on failure), so consumers in other processes skip
+    events the fast path handled and run the ones it failed or never finished.
+    Delivery across replicas is at-least-once: a copy handled while its marker
+    is missing (expired, or the write went through the outbox) runs twice.
+    Without an explicit redis_url, the shared "bus" pool is used.
     """
     
-    def __init__(self, redis_url: str = None):
-        self.redis_url = redis_url or settings.redis_url
+    def __init__(self, redis_url: str = None, codec: Union[str, PayloadCodec] = "json", local_delivery: Optional[bool] = None):
+        self.redis_url = redis_url # None: redis_pools "bus" pool
         self.redis: Redis = None
-        self.max_len = 10000 # Keep stream size manageable
+        self.default_retention = RetentionPolicy(max_len=10000) # Keep stream size manageable
+        self.retention: Dict[str, RetentionPolicy] = {} # Per-stream overrides
+        self._trimmer: Optional[asyncio.Task] = None
+        self.outbox: Optional[Outbox] = None # See enable_outbox
+        self.publish_timeout = 0.1 # Seconds a direct XADD may take before the event goes to the outbox
+        self.codec = get_codec(codec) # Used for publishing; consumers honour each message's "codec" field
+        self.local_delivery = settings.event_local_delivery if local_delivery is None else local_delivery
+        self.local_queue_size = 1000 # Full queue: event goes through Redis only
+        self.local_dedup_size = 10000 # Recent locally delivered event ids kept for dedup
+        self.local_lease = 900 # Seconds a "running" marker lives; a crashed origin's events run elsewhere after this
+        self.local_done_ttl = 86400 # Seconds a "done" marker lives; Redis copies read later than this run again
+        self.instance_id = uuid.uuid4().hex[:12] # "origin" on Redis copies of locally delivered events
+        self._local_subscribers: Dict[str, asyncio.Queue] = {}
+        self._local_tasks: List[asyncio.Task] = []
+        self._local_events: "OrderedDict[str, asyncio.Future]" = OrderedDict() # event id -> handled locally?
+        self._background: set = set() # In-flight background XADDs
+        self._in_flight: Set[Tuple[str, str]] = set() # (stream, msg_id) read by this process and not finished; reclaim skips them
         
     async def connect(self):
         """Connect to Redis"""
         if not self.redis:
-            self.redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            # Always raw bytes: any producer's codec may be on a stream, and one binary payload
+            # would make a decoding connection fail the whole XREADGROUP reply
+            if self.redis_url:
+                self.redis = aioredis.from_url(self.redis_url, decode_responses=False)
+            else:
+                self.redis = redis_pools.get("bus")
             logger.info("EventBus connected to Redis")
             
     async def disconnect(self):
         """Disconnect from Redis"""
+        await self.stop_trimmer()
+        for task in self._local_tasks:
+            task.cancel()
+        self._local_tasks, self._local_subscribers = [], {}
+        for done in self._local_events.values():
+            if not done.done():
+                done.cancel() # Never handled locally; background writers clear their markers
+        if self._background:
+            # Let fast-path events reach Redis before the connection goes away
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self.outbox:
+            await self.outbox.stop()
         if self.redis:
             await self.redis.close()
             self.redis = None
 
+    def _build_message(self, event_type: str, payload: Dict[str, Any], source: str, timestamp: str) -> Dict[str, str]:
+        """Build the flat string dict stored in the stream"""
+        return {
+            "id": str(uuid.uuid4()),
+            "type": event_type,
+            "source": source,
+            "timestamp": timestamp,
+            "codec": self.codec.name,
+            "payload": self.codec.encode(payload), # Redis streams store flat dicts of strings
+        }
+
+    def _decode_message(self, data: Dict[Any, Any], stream: str) -> Dict[str, Any]:
+        """Turn a raw stream entry back into a dict with a decoded payload and its source stream"""
+        message = {_text(k): v for k, v in data.items()}
+        payload = message.pop("payload", None)
+        message = {k: _text(v) for k, v in message.items()}
+        message["stream"] = stream
+        if payload is not None:
+            # Entries without a codec field predate codecs and are JSON
+            message["payload"] = get_codec(message.get("codec", "json")).decode(payload)
+        return message
+
     async def publish(self, stream: str, event_type: str, payload: Dict[str, Any], source: str = "orchestrator") -> str:
         """
         Publish an event to a specific stream.
-        Returns the Redis Stream ID.
+        Returns the Redis Stream ID. When a local subscriber takes the event,
+        the XADD runs in the background and the event id is returned instead.
         """
         if not self.redis:
             await self.connect()
             
-        event_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
-        
-        message = {
-            "id": event_id,
-            "type": event_type,
-            "source": source,
-            "timestamp": timestamp,
-            "payload": json.dumps(payload), # Redis streams store flat dicts of strings
-        }
+        message = self._build_message(event_type, payload, source, datetime.utcnow().isoformat())
         
+        done = self._deliver_local(stream, message, payload)
+        if done is not None:
+            task = asyncio.create_task(self._xadd_background(stream, message, done))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            return message["id"]
+            
+        if self.outbox is not None:
+            return await self._publish_buffered(stream, message)
+            
         try:
             # XADD: Append to stream
-            stream_id = await self.redis.xadd(stream, message, maxlen=self.max_len)
+            stream_id = _text(await self.redis.xadd(stream, message, **self.retention_for(stream).xadd_args()))
             logger.debug(f"Published event {event_type} to {stream}: {stream_id}")
             return stream_id
         except Exception as e:
             logger.error(f"Failed to publish event: {e}")
             raise
 
+    async def enable_outbox(self, max_size: int = 10000, overflow: str = "drop_oldest",
+                            spill_path: Optional[str] = None, publish_timeout: float = 0.1):
+        """
+        Buffer publishes instead of raising when Redis is slow or down.
+        A direct XADD gets `publish_timeout` seconds; on failure (or while older
+        events are still buffered) the event goes to a bounded Outbox that a
+        background flusher replays. Delivery becomes at-least-once: a timed-out
+        XADD may still have landed.
+        """
+        self.publish_timeout = publish_timeout
+        if not self.outbox:
+            self.outbox = Outbox(self._send_entries, max_size=max_size, overflow=overflow, spill_path=spill_path)
+            await self.outbox.start()
+
+    async def _publish_buffered(self, stream: str, message: Dict[str, Any]) -> str:
+        """Publish path with an outbox: returns the stream ID, or the event id if buffered"""
+        if not self.outbox.depth: # Don't jump ahead of buffered events
+            try:
+                return _text(await asyncio.wait_for(
+                    self.redis.xadd(stream, message, **self.retention_for(stream).xadd_args()), timeout=self.publish_timeout
+                ))
+            except Exception as e:
+                logger.warning(f"Publish to {stream} failed, buffering in outbox: {e!r}")
+        await self.outbox.put(stream, message)
+        return message["id"]
+
+    async def _send_entries(self, entries: List[tuple]):
+        """Outbox flusher transport: XADD (stream, message) pairs in one pipeline"""
+        if not self.redis:
+            await self.connect()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream, message in entries:
+                pipe.xadd(stream, message, **self.retention_for(stream).xadd_args())
+            await pipe.execute()
+
+    def _deliver_local(self, stream: str, message: Dict[str, Any], payload: Dict[str, Any]) -> Optional[asyncio.Future]:
+        """
+        Hand the event to this process's subscriber for `stream`, if any has room.
+        Returns the future resolving to whether the local handler succeeded, or None.
+        """
+        queue = self._local_subscribers.get(stream) if self.local_delivery else None
+        if queue is None:
+            return None
+        event = {k: v for k, v in message.items() if k != "payload"}
+        event.update(payload=payload, stream=stream)
+        done = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait((event, done))
+        except asyncio.QueueFull:
+            return None
+        message["origin"] = self.instance_id # Tells other processes to check the marker first
+        self._local_events[message["id"]] = done
+        while len(self._local_events) > self.local_dedup_size:
+            self._local_events.popitem(last=False)
+        return done
+
+    def _local_key(self, event_id: str) -> str:
+        return f"local_events:{event_id}"
+
+    async def _xadd_background(self, stream: str, message: Dict[str, Any], done: asyncio.Future):
+        """Persist a locally delivered event, then publish the local outcome through its marker"""
+        marker = self._local_key(message["id"])
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                # Marker first, so no consumer can read the entry before it exists
+                pipe.set(marker, "running", nx=True, ex=self.local_lease)
+                pipe.xadd(stream, message, **self.retention_for(stream).xadd_args())
+                await pipe.execute()
+        except Exception as e:
+            if self.outbox is None:
+                logger.error(f"Failed to persist locally delivered event {message['id']}: {e}")
+                return
+            await self.outbox.put(stream, message)
+        try:
+            handled = await asyncio.shield(done)
+        except asyncio.CancelledError:
+            handled = False # Local run abandoned (shutdown): let another process have it
+        try:
+            if handled:
+                await self.redis.set(marker, "done", ex=self.local_done_ttl)
+            else:
+                await self.redis.delete(marker)
+        except Exception as e:
+            logger.warning(f"Could not record local outcome of {message['id']}: {e}")
+
+    def subscribe_local(self, stream: str, handler: Callable):
+        """
+        Deliver events published on `stream` by this process straight to `handler`.
+        The Redis copy is still consumed normally, by whichever process reads it;
+        _dispatch skips it if the local handler succeeded and runs it if it failed.
+        """
+        if stream in self._local_subscribers:
+            raise ValueError(f"Local subscriber already registered for {stream}")
+        queue = asyncio.Queue(maxsize=self.local_queue_size)
+        self._local_subscribers[stream] = queue
+        self._local_tasks.append(asyncio.create_task(self._local_loop(queue, handler)))
+
+    async def _local_loop(self, queue: asyncio.Queue, handler: Callable):
+        while True:
+            event, done = await queue.get()
+            try:
+                await handler(event["id"], event)
+                done.set_result(True)
+            except Exception as e:
+                logger.error(f"Local handler failed for {event['id']}, falling back to Redis delivery: {e}")
+                done.set_result(False)
+
+    async def _dispatch(self, handler: Callable, msg_id: str, message: Dict[str, Any]):
+        """
+        Run handler for a Redis message unless the local fast path already handled it:
+        in this process by its future, elsewhere by its marker. Raises
+        LocalDeliveryPending (entry stays unacked) while the origin is still running it.
+        """
+        local = self._local_events.get(message.get("id"))
+        if local is not None:
+            if await asyncio.shield(local):
+                return
+        elif message.get("origin"):
+            state = _text(await self.redis.get(self._local_key(message["id"])))
+            if state == "done":
+                return
+            if state == "running":
+                raise LocalDeliveryPending(f"Event {message['id']} is still being handled by {message['origin']}")
+        await handler(msg_id, message)
+
+    async def publish_many(self, stream: str, events: List[Dict[str, Any]]) -> List[str]:
+        """
+        Publish several events to one stream in a single pipelined round-trip.
+        Each event is a dict with "type", "payload" and optional "source".
+        Returns the Redis Stream IDs in the same order as `events`
+        (event ids for events that went to the outbox).
+        """
+        if not events:
+            return []
+        if not self.redis:
+            await self.connect()
+            
+        timestamp = datetime.utcnow().isoformat() # One timestamp per batch
+        trim = self.retention_for(stream).xadd_args()
+        messages = [
+            self._build_message(event["type"], event.get("payload", {}), event.get("source", "orchestrator"), timestamp)
+            for event in events
+        ]
+        
+        try:
+            if self.outbox is not None and self.outbox.depth:
+                raise ConnectionError("outbox not drained") # Keep order behind buffered events
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for message in messages:
+                    pipe.xadd(stream, message, **trim)
+                stream_ids = [_text(stream_id) for stream_id in await pipe.execute()]
+            logger.debug(f"Published {len(stream_ids)} events to {stream}")
+            return stream_ids
+        except Exception as e:
+            if self.outbox is not None:
+                for message in messages:
+                    await self.outbox.put(stream, message)
+                return [message["id"] for message in messages]
+            logger.error(f"Failed to publish batch: {e}")
+            raise
+
+    def set_retention(self, stream: str, policy: RetentionPolicy):
+        """Override the default retention for one stream"""
+        self.retention[stream] = policy
+
+    def retention_for(self, stream: str) -> RetentionPolicy:
+        return self.retention.get(stream, self.default_retention)
+
+    async def trim(self) -> Dict[str, int]:
+        """Apply max_age (XTRIM MINID ~) to every stream that has one. Returns entries removed per stream."""
+        if not self.redis:
+            await self.connect()
+        policies = [(stream, policy) for stream, policy in self.retention.items() if policy.max_age is not None]
+        if not policies:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream, policy in policies:
+                pipe.xtrim(stream, minid=policy.min_id(), approximate=policy.approximate)
+            removed = await pipe.execute()
+        return {stream: count for (stream, _), count in zip(policies, removed) if count}
+
+    async def start_trimmer(self, interval: float = 60):
+        """Run trim() every `interval` seconds in the background"""
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    removed = await self.trim()
+                    if removed:
+                        logger.debug(f"Trimmed streams: {removed}")
+                except Exception as e:
+                    logger.error(f"Stream trim error: {e}")
+        if not self._trimmer:
+            self._trimmer = asyncio.create_task(loop())
+
+    async def stop_trimmer(self):
+        if self._trimmer:
+            self._trimmer.cancel()
+            try:
+                await self._trimmer
+            except asyncio.CancelledError:
+                pass
+            self._trimmer = None
+
+    async def stream_stats(self, streams: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Length, MEMORY USAGE and retention for each stream (default: streams with
+        a retention override). Missing streams report zeros.
+        """
+        if not self.redis:
+            await self.connect()
+        streams = list(dict.fromkeys(streams if streams is not None else self.retention))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream in streams:
+                pipe.xlen(stream)
+                pipe.memory_usage(stream, samples=0)
+            replies = await pipe.execute()
+        return {
+            stream: {
+                "length": replies[2 * i] or 0,
+                "memory_bytes": replies[2 * i + 1] or 0,
+                "retention": repr(self.retention_for(stream)),
+            }
+            for i, stream in enumerate(streams)
+        }
+
     async def create_group(self, stream: str, group: str):
         """Create a consumer group if it doesn't exist"""
         if not self.redis:
@@ -73,37 +407,418 @@ class EventBus:
             if "BUSYGROUP" not in str(e):
                 raise
 
-    async def consume(self, stream: str, group: str, consumer: str, handler: Callable, count: int = 10):
+    async def consume(self, stream: Union[str, List[str]], group: str, consumer: str, handler: Callable, count: int = 10, block: Optional[int] = None) -> int:
         """
-        Consume messages from a stream as part of a group.
+        Consume messages from one or more streams as part of a group.
         This is intended to be run in a loop background task.
+        Several streams are read with a single XREADGROUP; handlers see the
+        source stream in data["stream"].
+        block: Server-side BLOCK timeout in ms. None returns immediately when idle.
+        Returns the number of messages acknowledged.
         """
         if not self.redis:
             await self.connect()
             
         try:
             # XREADGROUP
-            streams = {stream: ">"} # ">" means new messages never delivered to this consumer
-            messages = await self.redis.xreadgroup(group, consumer, streams, count=count)
+            streams = {name: ">" for name in _stream_list(stream)} # ">" means new messages never delivered to this consumer
+            messages = await self.redis.xreadgroup(group, consumer, streams, count=count, block=block)
+            if not messages:
+                return 0
             
-            for stream_name, msgs in messages:
-                for msg_id, data in msgs:
-                    try:
-                        # Parse payload back to JSON
-                        if 'payload' in data:
-                            data['payload'] = json.loads(data['payload'])
-                            
-                        await handler(msg_id, data)
-                        
-                        # XACK: Acknowledge processing
-                        await self.redis.xack(stream, group, msg_id)
-                    except Exception as e:
-                        logger.error(f"Error processing message {msg_id}: {e}")
-                        # Don't ack so it can be retried or claimed
+            batches = [(_text(stream_name), [(_text(msg_id), data) for msg_id, data in msgs]) for stream_name, msgs in messages]
+            # The whole read is in flight until handled, not just the message currently running
+            keys = {(stream_name, msg_id) for stream_name, msgs in batches for msg_id, _ in msgs}
+            self._in_flight.update(keys)
+            try:
+                handled = 0
+                for stream_name, msgs in batches:
+                    handled += await self._handle_batch(stream_name, group, msgs, handler)
+                return handled
+            finally:
+                self._in_flight.difference_update(keys)
                         
         except Exception as e:
             logger.error(f"Consume error: {e}")
             await asyncio.sleep(1) # Backoff
+            return 0
+
+    async def _handle_batch(self, stream: str, group: str, msgs: List[tuple], handler: Callable) -> int:
+        """Run handler over (msg_id, data) pairs and XACK the successes in one round-trip"""
+        acked: List[str] = []
+        keys = {(stream, _text(msg_id)) for msg_id, _ in msgs}
+        self._in_flight.update(keys)
+        try:
+            for msg_id, data in msgs:
+                msg_id = _text(msg_id)
+                try:
+                    await self._dispatch(handler, msg_id, self._decode_message(data, stream))
+                    acked.append(msg_id)
+                except LocalDeliveryPending as e:
+                    logger.debug(f"Leaving {msg_id} pending: {e}")
+                except Exception as e:
+                    logger.error(f"Error processing message {msg_id}: {e}")
+                    # Don't ack so it can be retried or claimed
+        finally:
+            self._in_flight.difference_update(keys)
+                
+        # XACK: Acknowledge the whole batch in a single round-trip
+        if acked:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xack(stream, group, *acked)
+                await pipe.execute()
+        return len(acked)
+
+    async def consume_forever(self, stream: Union[str, List[str]], group: str, consumer: str, handler: Callable,
+                              count: int = 100, block: int = 5000, should_run: Callable[[], bool] = lambda: True):
+        """
+        Long-lived consumption loop.
+        Blocks server-side for up to `block` ms per read, so an idle consumer costs
+        roughly one round-trip per block timeout and a busy one sees no added delay.
+        """
+        while should_run():
+            await self.consume(stream, group, consumer, handler, count=count, block=block)
+
+    async def last_id(self, stream: str) -> str:
+        """ID of the newest entry in `stream` ("0-0" if empty); tail from it to miss nothing published after this call"""
+        if not self.redis:
+            await self.connect()
+        entries = await self.redis.xrevrange(stream, count=1)
+        return _text(entries[0][0]) if entries else "0-0"
+
+    async def tail(self, stream: Union[str, List[str]], handler: Callable, last_id: str = "$",
+                   count: int = 100, block: int = 5000, should_run: Callable[[], bool] = lambda: True):
+        """
+        Broadcast consumption: plain XREAD, no consumer group, so every process
+        tailing a stream sees every event (e.g. for per-process caches).
+        Starts after `last_id` ("$": only events published from now on).
+        Nothing is acked; a handler error is logged and the event skipped.
+        """
+        if not self.redis:
+            await self.connect()
+        streams = {name: last_id for name in _stream_list(stream)}
+        while should_run():
+            try:
+                messages = await self.redis.xread(streams, count=count, block=block)
+            except Exception as e:
+                logger.error(f"Tail error: {e}")
+                await asyncio.sleep(1) # Backoff
+                continue
+            for stream_name, msgs in messages or []:
+                stream_name = _text(stream_name)
+                for msg_id, data in msgs:
+                    msg_id = _text(msg_id)
+                    streams[stream_name] = msg_id
+                    try:
+                        await handler(msg_id, self._decode_message(data, stream_name))
+                    except Exception as e:
+                        logger.error(f"Error processing tailed message {msg_id}: {e}")
+
+    def _heartbeat_key(self, group: str) -> str:
+        return f"heartbeats:{group}"
+
+    async def heartbeat(self, group: str, consumer: str):
+        """Record that `consumer` is alive; reclaim leaves a live consumer's pending entries alone"""
+        if not self.redis:
+            await self.connect()
+        await self.redis.hset(self._heartbeat_key(group), consumer, int(time.time() * 1000))
+
+    async def clear_heartbeat(self, group: str, consumer: str):
+        """Mark `consumer` gone, so its pending entries can be taken over without waiting for it to look dead"""
+        if not self.redis:
+            await self.connect()
+        await self.redis.hdel(self._heartbeat_key(group), consumer)
+
+    async def reclaim(self, stream: str, group: str, consumer: str, handler: Callable,
+                      min_idle_ms: int = 60000, count: int = 100, max_deliveries: int = 5,
+                      dead_letter_stream: Optional[str] = None, consumer_timeout_ms: Optional[int] = None) -> int:
+        """
+        Retry entries stuck in the group's PEL, claiming them to `consumer` (XCLAIM),
+        and copy entries delivered more than `max_deliveries` times to the dead-letter
+        stream. Only two kinds of entry are touched, each once idle >= min_idle_ms:
+        - `consumer`'s own entries that this process is not handling (failed handlers)
+        - entries of consumers that look dead: no heartbeat (or, without one, no
+          XINFO activity) for consumer_timeout_ms (default: min_idle_ms)
+        Entries a live consumer is still working on are never claimed, however long
+        its handler runs. Returns the number of entries acked.
+        """
+        if not self.redis:
+            await self.connect()
+        dead_letter_stream = dead_letter_stream or f"{stream}:dead"
+        consumer_timeout_ms = consumer_timeout_ms or min_idle_ms
+        
+        acked = 0
+        try:
+            consumers = await self.redis.xinfo_consumers(stream, group)
+            beats = {_text(k): int(v) for k, v in (await self.redis.hgetall(self._heartbeat_key(group))).items()}
+            now_ms = int(time.time() * 1000)
+            for info in consumers:
+                owner = _text(info["name"])
+                if not info["pending"]:
+                    continue
+                if owner != consumer:
+                    silent_ms = now_ms - beats[owner] if owner in beats else info["idle"]
+                    if silent_ms < consumer_timeout_ms:
+                        continue # Alive: it retries its own failures
+                    logger.info(f"Consumer {owner} on {stream}/{group} silent for {silent_ms}ms, taking over its entries")
+                acked += await self._reclaim_from(stream, group, consumer, owner, handler, min_idle_ms, count,
+                                                  max_deliveries, dead_letter_stream)
+        except Exception as e:
+            logger.error(f"Reclaim error: {e}")
+        return acked
+
+    async def _reclaim_from(self, stream: str, group: str, consumer: str, owner: str, handler: Callable,
+                            min_idle_ms: int, count: int, max_deliveries: int, dead_letter_stream: str) -> int:
+        """Claim and rerun `owner`'s entries idle >= min_idle_ms, skipping ones in flight here; one pass"""
+        acked = 0
+        start_id = "-"
+        while True:
+            pending = await self.redis.xpending_range(
+                stream, group, min=start_id, max="+", count=count, consumername=owner, idle=min_idle_ms
+            )
+            if not pending:
+                break
+            start_id = f"({_text(pending[-1]['message_id'])}" # Exclusive: next page
+            # XCLAIM bumps the delivery counter
+            deliveries = {_text(p["message_id"]): p["times_delivered"] + 1 for p in pending}
+            ids = [msg_id for msg_id in deliveries if (stream, msg_id) not in self._in_flight]
+            if ids:
+                # min_idle_ms again: another process claiming the same entry makes it busy, so only one wins
+                claimed = [(_text(msg_id), data) for msg_id, data in await self.redis.xclaim(stream, group, consumer, min_idle_ms, ids) if msg_id]
+                acked += await self._ack_trimmed(stream, group, consumer, set(ids) - {msg_id for msg_id, _ in claimed})
+                
+                retry, poison = [], []
+                for msg_id, data in claimed:
+                    (poison if deliveries[msg_id] > max_deliveries else retry).append((msg_id, data))
+                    
+                if poison:
+                    acked += await self._dead_letter(stream, group, dead_letter_stream, poison, deliveries)
+                if retry:
+                    acked += await self._handle_batch(stream, group, retry, handler)
+            if len(pending) < count:
+                break
+        return acked
+
+    async def _ack_trimmed(self, stream: str, group: str, consumer: str, ids: Set[str]) -> int:
+        """Ack entries XCLAIM moved to `consumer` but returned without data (trimmed from the stream)"""
+        if not ids:
+            return 0
+        ours = [
+            msg_id for msg_id in ids
+            if not await self.redis.xrange(stream, min=msg_id, max=msg_id)
+            and await self.redis.xpending_range(stream, group, min=msg_id, max=msg_id, count=1, consumername=consumer)
+        ]
+        if ours:
+            logger.warning(f"Acking {len(ours)} pending entries trimmed from {stream} before they could be retried")
+            await self.redis.xack(stream, group, *ours)
+        return len(ours)
+
+    async def _dead_letter(self, stream: str, group: str, dead_letter_stream: str, msgs: List[tuple], deliveries: Dict[str, int]) -> int:
+        """Move poison messages to the dead-letter stream and ack them in the source group"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for msg_id, data in msgs:
+                logger.warning(f"Dead-lettering {msg_id} from {stream} after {deliveries.get(msg_id, 0)} deliveries")
+                pipe.xadd(dead_letter_stream, {
+                    **data,
+                    "dead_letter_origin": stream,
+                    "dead_letter_id": msg_id,
+                    "dead_letter_deliveries": str(deliveries.get(msg_id, 0)),
+                }, **self.retention_for(dead_letter_stream).xadd_args())
+            pipe.xack(stream, group, *[msg_id for msg_id, _ in msgs])
+            await pipe.execute()
+        return len(msgs)
+
+    async def prune_consumers(self, stream: str, group: str, idle_ms: int = 3600000, keep: Optional[str] = None) -> int:
+        """
+        Delete group consumers with no pending entries that have been idle for `idle_ms`.
+        Run after `reclaim` so crashed consumers have already been drained.
+        Returns the number of consumers removed.
+        """
+        if not self.redis:
+            await self.connect()
+        try:
+            consumers = await self.redis.xinfo_consumers(stream, group)
+            dead = [_text(c["name"]) for c in consumers if c["pending"] == 0 and c["idle"] >= idle_ms and _text(c["name"]) != keep]
+            if dead:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for name in dead:
+                        pipe.xgroup_delconsumer(stream, group, name)
+                    pipe.hdel(self._heartbeat_key(group), *dead)
+                    await pipe.execute()
+                logger.info(f"Pruned {len(dead)} idle consumers from {stream}/{group}")
+            return len(dead)
+        except Exception as e:
+            logger.error(f"Prune consumers error: {e}")
+            return 0
+
+    async def consume_concurrent(self, stream: Union[str, List[str]], group: str, consumer: str, handler: Callable,
+                                 count: int = 100, block: int = 5000, concurrency: int = 10,
+                                 key: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                                 should_run: Callable[[], bool] = lambda: True, max_deliveries: int = 5,
+                                 dead_letter_suffix: str = ":dead", retry_delay: float = 1.0):
+        """
+        Long-lived consumption loop running up to `concurrency` handlers at once.
+        key: Optional partition function over the decoded message. Messages with the
+        same non-None key are handled in stream order; others run freely.
+        Each message is acked as soon as its handler completes. Reads pause while
+        all slots are taken, so in-flight work stays bounded.
+        A failed keyed message blocks its key: it is retried in place (backoff from
+        `retry_delay`) until it succeeds or has run `max_deliveries` times, then goes to
+        <stream><dead_letter_suffix>, and only then do later messages on the key run.
+        Unkeyed failures stay pending for reclaim, as in consume().
+        """
+        if not self.redis:
+            await self.connect()
+            
+        slots = asyncio.Semaphore(concurrency)
+        lanes: Dict[Any, asyncio.Task] = {} # partition key -> last scheduled task
+        
+        streams = {name: ">" for name in _stream_list(stream)}
+        
+        async def attempt(msg_id: str, data: Dict[str, Any]) -> Optional[bool]:
+            """True when handled, False when the handler failed, None when another replica is running it"""
+            try:
+                await self._dispatch(handler, msg_id, data)
+                return True
+            except LocalDeliveryPending as e:
+                logger.debug(f"Leaving {msg_id} pending: {e}")
+                return None
+            except Exception as e:
+                logger.error(f"Error processing message {msg_id}: {e}")
+                return False
+            
+        async def run(msg_id: str, fields: Dict, data: Dict[str, Any], previous: Optional[asyncio.Task], ordered: bool):
+            stream_name = data["stream"]
+            try:
+                if previous:
+                    await asyncio.wait([previous]) # Acked, dead-lettered or left to its origin replica; never just failed
+                deliveries = 1
+                while not (handled := await attempt(msg_id, data)):
+                    if handled is None or not ordered:
+                        return # Don't ack so it can be retried or claimed
+                    if deliveries >= max_deliveries:
+                        await self._dead_letter(stream_name, group, f"{stream_name}{dead_letter_suffix}",
+                                                [(msg_id, fields)], {msg_id: deliveries})
+                        return
+                    await asyncio.sleep(retry_delay * 2 ** (deliveries - 1))
+                    deliveries += 1
+                await self.redis.xack(stream_name, group, msg_id)
+            except Exception as e:
+                logger.error(f"Error settling message {msg_id}: {e}")
+            finally:
+                self._in_flight.discard((stream_name, msg_id))
+                slots.release()
+                
+        async with asyncio.TaskGroup() as tg:
+            while should_run():
+                try:
+                    messages = await self.redis.xreadgroup(group, consumer, streams, count=min(count, concurrency), block=block)
+                except Exception as e:
+                    logger.error(f"Consume error: {e}")
+                    await asyncio.sleep(1) # Backoff
+                    continue
+                    
+                # In flight from the read on, including entries still waiting for a slot
+                self._in_flight.update((_text(stream_name), _text(msg_id)) for stream_name, msgs in messages or [] for msg_id, _ in msgs)
+                for stream_name, msgs in messages or []:
+                    stream_name = _text(stream_name)
+                    for msg_id, fields in msgs:
+                        msg_id = _text(msg_id)
+                        await slots.acquire()
+                        try:
+                            data = self._decode_message(fields, stream_name)
+                            partition = key(data) if key else None
+                        except Exception as e:
+                            logger.error(f"Error decoding message {msg_id}: {e}")
+                            self._in_flight.discard((stream_name, msg_id))
+                            slots.release()
+                            continue
+                            
+                        task = tg.create_task(run(msg_id, fields, data, lanes.get(partition), partition is not None))
+                        if partition is not None:
+                            lanes[partition] = task
+                            task.add_done_callback(lambda t, p=partition: lanes.pop(p, None) if lanes.get(p) is t else None)
+
+class BatchPublisher:
+    """
+    Auto-batching publisher on top of EventBus.publish_many.
+    Events are buffered for up to `max_delay` seconds or `max_batch` items,
+    then flushed per stream in one pipeline. Each publish returns a future
+    resolving to that event's Redis Stream ID.
+    """
+    
+    def __init__(self, event_bus: EventBus, max_batch: int = 100, max_delay: float = 0.005):
+        self.event_bus = event_bus
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[tuple] = [] # (stream, event, future)
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        
+    async def start(self):
+        """Start the background flusher"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run_loop())
+            
+    async def stop(self):
+        """Stop the flusher once its current flush completes, then flush anything still buffered"""
+        if self._task:
+            # Not cancel(): a flush already has its batch out of _pending, and its futures would never resolve
+            self._stopping = True
+            self._has_items.set()
+            self._full.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+        await self.flush()
+        
+    def publish(self, stream: str, event_type: str, payload: Dict[str, Any], source: str = "orchestrator") -> asyncio.Future:
+        """Queue an event. Await the returned future for its stream ID."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((stream, {"type": event_type, "payload": payload, "source": source}, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return future
+        
+    async def flush(self):
+        """Send everything currently buffered, one pipeline per stream"""
+        batch, self._pending = self._pending, []
+        by_stream: Dict[str, List[tuple]] = {}
+        for stream, event, future in batch:
+            by_stream.setdefault(stream, []).append((event, future))
+            
+        for stream, items in by_stream.items():
+            try:
+                stream_ids = await self.event_bus.publish_many(stream, [event for event, _ in items])
+                for (_, future), stream_id in zip(items, stream_ids):
+                    if not future.done():
+                        future.set_result(stream_id)
+            except asyncio.CancelledError:
+                # Cancelled mid-flush: nobody else holds this batch, so release every waiter on it
+                for _, _, future in batch:
+                    if not future.done():
+                        future.cancel()
+                raise
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                        
+    async def _run_loop(self):
+        """Flush when the batch fills or max_delay elapses"""
+        while not self._stopping:
+            # Sleep until the first event of a batch arrives, then linger briefly for more
+            await self._has_items.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._has_items.clear()
+            self._full.clear()
+            await self.flush()
 
 # Global singleton
 event_bus = EventBus()
@@ -0,0 +1,267 @@
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from services.mildlyawesome.config import settings
+from services.mildlyawesome.db import engine
+from services.mildlyawesome.vector import CHANGE_STREAM, DIM, DISTANCE_OPERATORS, DocumentChunk, SearchHit
+
+logger = logging.getLogger("mildlyawesome.local_index")
+
+class LocalVectorIndex:
+    """
+    In-process exact k-NN over a contiguous float32 matrix, for collections small
+    enough that a matrix product beats a database round-trip.
+    pgvector stays the source of truth: the index loads from DocumentChunk (or a
+    memory-mapped snapshot plus catch-up), follows CHUNKS_CHANGED events on
+    CHANGE_STREAM, and turns itself off (ready=False) past `max_rows` so callers
+    fall back to VectorStore.
+    Distances match pgvector's operators, so SearchHits are interchangeable.
+    Searches over more than `inline_rows` rows run in a worker thread (NumPy
+    releases the GIL), so a large index never stalls the event loop.
+    """
+
+    def __init__(self, distance: Optional[str] = None, max_rows: Optional[int] = None,
+                 snapshot_path: Optional[str] = None, inline_rows: int = 4096):
+        self.distance = distance or settings.vector_index_distance
+        if self.distance not in DISTANCE_OPERATORS:
+            raise ValueError(f"Unknown distance: {self.distance}")
+        self.max_rows = max_rows or settings.vector_local_index_max_rows
+        self.snapshot_path = snapshot_path or settings.vector_local_index_snapshot or None
+        self.inline_rows = inline_rows
+        self._task: Optional[asyncio.Task] = None
+        self.clear()
+
+    def __len__(self) -> int:
+        return self._n
+
+    # Storage
+
+    def _prepare(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, DIM)
+        if self.distance == "cosine":
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1, norms)
+        return embeddings
+
+    def _reserve(self, rows: int):
+        """Grow by doubling; also copies a read-only memory-mapped snapshot into RAM"""
+        capacity = len(self._matrix)
+        if rows <= capacity and self._matrix.flags.writeable:
+            return
+        capacity = max(rows, capacity * 2, 1024)
+        for name in ("_matrix", "_sq_norms", "_ids"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def add(self, ids: Sequence[int], contents: Sequence[str], metadatas: Sequence[Dict[str, Any]], embeddings: Any):
+        """Insert or replace chunks"""
+        self.remove([i for i in ids if i in self._rows])
+        embeddings = self._prepare(embeddings)
+        start, end = self._n, self._n + len(ids)
+        self._reserve(end)
+        self._matrix[start:end] = embeddings
+        self._sq_norms[start:end] = (embeddings ** 2).sum(axis=1)
+        self._ids[start:end] = ids
+        for offset, (chunk_id, content, metadata) in enumerate(zip(ids, contents, metadatas)):
+            self._rows[chunk_id] = start + offset
+            self._docs[chunk_id] = (content, metadata or {})
+        self._n = end
+
+    def remove(self, ids: Sequence[int]):
+        """Drop chunks; the last row moves into each hole so the matrix stays dense"""
+        if not any(i in self._rows for i in ids):
+            return
+        self._reserve(self._n)
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            self._docs.pop(chunk_id, None)
+            last = self._n - 1
+            if row != last:
+                moved = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._n = last
+
+    def clear(self):
+        """Empty the index and mark it not ready"""
+        self.ready = False
+        self._matrix = np.empty((0, DIM), dtype=np.float32) # Rows normalized for cosine
+        self._sq_norms = np.empty(0, dtype=np.float32) # Used for l2
+        self._ids = np.empty(0, dtype=np.int64)
+        self._n = 0
+        self._rows: Dict[int, int] = {} # chunk id -> matrix row
+        self._docs: Dict[int, Tuple[str, Dict[str, Any]]] = {} # chunk id -> (content, metadata)
+
+    # Search
+
+    def _top(self, queries: np.ndarray, matrix: np.ndarray, sq_norms: np.ndarray, ids: np.ndarray,
+             limit: int) -> List[List[Tuple[int, float]]]:
+        """(chunk id, distance) pairs, nearest first, per query; touches only the arrays passed in"""
+        products = matrix @ queries.T # (rows, queries)
+        if self.distance == "cosine":
+            distances = 1.0 - products
+        elif self.distance == "ip":
+            distances = -products
+        else:
+            squared = sq_norms[:, None] + (queries ** 2).sum(axis=1)[None, :] - 2 * products
+            distances = np.sqrt(np.maximum(squared, 0))
+        k = min(limit, len(matrix))
+        top = np.argpartition(distances, k - 1, axis=0)[:k]
+        results = []
+        for q in range(len(queries)):
+            rows = top[:, q]
+            rows = rows[np.argsort(distances[rows, q])]
+            results.append([(int(ids[row]), float(distances[row, q])) for row in rows])
+        return results
+
+    def search_many_sync(self, query_embeddings: Sequence[Sequence[float]], limit: int = 5) -> List[List[SearchHit]]:
+        """Exact top `limit` per query: one matrix product, argpartition, then a sort of k rows each"""
+        if not self._n or not len(query_embeddings):
+            return [[] for _ in query_embeddings]
+        n = self._n
+        top = self._top(self._prepare(np.asarray(query_embeddings)), self._matrix[:n], self._sq_norms[:n], self._ids[:n], limit)
+        return [[self._hit(chunk_id, distance) for chunk_id, distance in hits] for hits in top]
+
+    async def search_many(self, query_embeddings: Sequence[Sequence[float]], limit: int = 5) -> List[List[SearchHit]]:
+        """search_many_sync, in a worker thread past inline_rows"""
+        if self._n <= self.inline_rows or not len(query_embeddings):
+            return self.search_many_sync(query_embeddings, limit)
+        # Views plus a copy of the ids: rows removed meanwhile may be overwritten under the
+        # thread, but then map to a chunk id no longer in _docs and are dropped below
+        n = self._n
+        top = await asyncio.to_thread(
+            self._top, self._prepare(np.asarray(query_embeddings)), self._matrix[:n], self._sq_norms[:n], self._ids[:n].copy(), limit
+        )
+        return [[self._hit(chunk_id, distance) for chunk_id, distance in hits if chunk_id in self._docs] for hits in top]
+
+    async def search(self, query_embedding: Sequence[float], limit: int = 5) -> List[SearchHit]:
+        return (await self.search_many([query_embedding], limit))[0]
+
+    def _hit(self, chunk_id: int, distance: float) -> SearchHit:
+        content, metadata = self._docs[chunk_id]
+        return SearchHit(DocumentChunk(id=chunk_id, content=content, metadata_json=metadata), distance, self.distance)
+
+    # Sync with pgvector
+
+    async def _fetch(self, ids: Optional[Sequence[int]] = None, batch_size: int = 5000):
+        """Stream rows (all, or just `ids`) from DocumentChunk into the index"""
+        statement = select(DocumentChunk.id, DocumentChunk.content, DocumentChunk.metadata_json, DocumentChunk.embedding)
+        if ids is not None:
+            statement = statement.where(DocumentChunk.id.in_(list(ids)))
+        async with engine.connect() as conn:
+            result = await conn.stream(statement.order_by(DocumentChunk.id))
+            async for rows in result.partitions(batch_size):
+                chunk_ids, contents, metadatas, embeddings = zip(*rows)
+                self.add(chunk_ids, contents, metadatas, np.stack([np.asarray(e, dtype=np.float32) for e in embeddings]))
+
+    async def load(self):
+        """
+        Fill the index: from the snapshot when there is one (memory-mapped, then
+        reconciled with the table), else from DocumentChunk. A snapshot that can't
+        be used (other distance, missing or corrupt files) falls back to the table.
+        Stays off when the table holds more than max_rows.
+        """
+        start = time.perf_counter()
+        async with engine.connect() as conn:
+            count = (await conn.execute(select(func.count()).select_from(DocumentChunk))).scalar()
+        if count > self.max_rows:
+            logger.info(f"Local vector index disabled: {count} rows > max_rows={self.max_rows}, serving from pgvector")
+            self.clear()
+            return
+        loaded = False
+        if self.snapshot_path and os.path.exists(f"{self.snapshot_path}.ids.npy"):
+            try:
+                self.load_snapshot()
+                loaded = True
+            except Exception as e:
+                logger.warning(f"Local vector index snapshot {self.snapshot_path} unusable, loading from pgvector: {e}")
+        if loaded:
+            await self._reconcile()
+        else:
+            self.clear()
+            await self._fetch()
+        self.ready = True
+        logger.info(f"Local vector index loaded {self._n} chunks in {time.perf_counter() - start:.2f}s")
+
+    async def _reconcile(self):
+        """Bring a snapshot up to date: drop rows deleted since, fetch rows added since"""
+        async with engine.connect() as conn:
+            live = set((await conn.execute(select(DocumentChunk.id))).scalars())
+        self.remove([i for i in self._rows if i not in live])
+        missing = [i for i in live if i not in self._rows]
+        for i in range(0, len(missing), 5000):
+            await self._fetch(ids=missing[i:i + 5000])
+
+    async def apply(self, msg_id: str, message: Dict[str, Any]):
+        """EventBus.tail handler for CHUNKS_CHANGED"""
+        if message.get("type") != "CHUNKS_CHANGED" or not self.ready:
+            return
+        payload = message.get("payload") or {}
+        self.remove(payload.get("deleted", []))
+        if payload.get("added"):
+            await self._fetch(ids=payload["added"])
+        if self._n > self.max_rows:
+            logger.info(f"Local vector index outgrew max_rows={self.max_rows}, falling back to pgvector")
+            self.clear()
+
+    async def start(self, event_bus):
+        """
+        Load, then follow change events (every process sees every event).
+        The stream position is taken before loading, so changes published while
+        the load runs are replayed; applying one the load already saw is harmless.
+        """
+        last_id = await event_bus.last_id(CHANGE_STREAM)
+        await self.load()
+        if not self._task:
+            self._task = asyncio.create_task(event_bus.tail(CHANGE_STREAM, self.apply, last_id=last_id))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.ready and self.snapshot_path:
+            await asyncio.to_thread(self.save)
+
+    # Snapshots
+
+    def save(self, path: Optional[str] = None):
+        """Write <path>.vectors.npy / .ids.npy / .docs.json; vectors are stored as indexed (normalized for cosine)"""
+        path = path or self.snapshot_path
+        np.save(f"{path}.vectors.npy", self._matrix[:self._n])
+        np.save(f"{path}.ids.npy", self._ids[:self._n])
+        with open(f"{path}.docs.json", "w") as f:
+            json.dump({"distance": self.distance, "docs": {str(k): v for k, v in self._docs.items()}}, f)
+        logger.info(f"Local vector index snapshot written to {path} ({self._n} chunks)")
+
+    def load_snapshot(self, path: Optional[str] = None, mmap: bool = True):
+        """Map the snapshot read-only; the first write copies it into RAM"""
+        path = path or self.snapshot_path
+        with open(f"{path}.docs.json") as f:
+            meta = json.load(f)
+        if meta["distance"] != self.distance:
+            raise ValueError(f"Snapshot {path} was built for {meta['distance']}, index uses {self.distance}")
+        self._matrix = np.load(f"{path}.vectors.npy", mmap_mode="r" if mmap else None)
+        self._ids = np.load(f"{path}.ids.npy")
+        self._n = len(self._ids)
+        self._sq_norms = (np.asarray(self._matrix) ** 2).sum(axis=1).astype(np.float32)
+        self._rows = {int(chunk_id): row for row, chunk_id in enumerate(self._ids)}
+        self._docs = {int(k): tuple(v) for k, v in meta["docs"].items()}
+
+# Global instance
+local_index = LocalVectorIndex()
@@ -1,37 +1,290 @@
 
 from redis.asyncio import Redis
 from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import logging
+import time
+import uuid
 
 logger = logging.getLogger("mildlyawesome.lock")
 
+# Every primitive uses the same script contract:
+#   acquire ARGV: owner, ttl ms, now ms, ...extra  -> {1, fencing token} or {0, ms until worth retrying}
+#   renew   ARGV: owner, ttl ms, now ms            -> 1 if the lease is still ours and was extended
+#   release ARGV: owner, channel                   -> frees the lease and wakes waiters via PUBLISH
+
+# KEYS: lock, fence
+LOCK_ACQUIRE = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return {1, redis.call('INCR', KEYS[2])}
+end
+return {0, redis.call('PTTL', KEYS[1])}
+"""
+
+# KEYS: lock
+LOCK_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lock
+LOCK_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('PUBLISH', ARGV[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# KEYS: holders zset (owner -> lease expiry ms), fence   extra ARGV: limit
+SEMAPHORE_ACQUIRE = """
+local now, ttl = tonumber(ARGV[3]), tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+    if redis.call('PTTL', KEYS[1]) < ttl then redis.call('PEXPIRE', KEYS[1], ttl) end
+    return {1, redis.call('INCR', KEYS[2])}
+end
+local first = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, tonumber(first[2]) - now}
+"""
+
+# KEYS: holders zset
+ZSET_RENEW = """
+local now, ttl = tonumber(ARGV[3]), tonumber(ARGV[2])
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], 'XX', now + ttl, ARGV[1])
+    if redis.call('PTTL', KEYS[1]) < ttl then redis.call('PEXPIRE', KEYS[1], ttl) end
+    return 1
+end
+return 0
+"""
+
+# KEYS: holders zset
+ZSET_RELEASE = """
+local removed = redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('PUBLISH', ARGV[2], ARGV[1])
+return removed
+"""
+
+# KEYS: readers zset, writer, writer intent, fence
+# A waiting writer leaves an intent key that holds off new readers, so writers don't starve.
+READ_ACQUIRE = """
+local now, ttl = tonumber(ARGV[3]), tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local writer = redis.call('PTTL', KEYS[2])
+if writer > 0 then return {0, writer} end
+local intent = redis.call('PTTL', KEYS[3])
+if intent > 0 then return {0, intent} end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+if redis.call('PTTL', KEYS[1]) < ttl then redis.call('PEXPIRE', KEYS[1], ttl) end
+return {1, redis.call('INCR', KEYS[4])}
+"""
+
+# KEYS: readers zset, writer, writer intent, fence
+WRITE_ACQUIRE = """
+local now, ttl = tonumber(ARGV[3]), tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local writer = redis.call('PTTL', KEYS[2])
+if writer > 0 then return {0, writer} end
+if redis.call('ZCARD', KEYS[1]) > 0 then
+    redis.call('SET', KEYS[3], ARGV[1], 'PX', ttl)
+    local first = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tonumber(first[2]) - now}
+end
+redis.call('SET', KEYS[2], ARGV[1], 'PX', ttl)
+redis.call('DEL', KEYS[3])
+return {1, redis.call('INCR', KEYS[4])}
+"""
+
+# In-process gates in front of Redis, so only local winners issue Redis commands
+_local_gates: Dict[Tuple[str, str], Any] = {}
+
+def _local_gate(kind: str, name: str, factory) -> Any:
+    key = (kind, name)
+    if key not in _local_gates:
+        _local_gates[key] = factory()
+    return _local_gates[key]
+
+class LockLost(Exception):
+    """The lease expired or was taken over while the body was running"""
+    pass
+
+class LockLease:
+    """
+    Handle yielded by distributed_lock and friends. Truthy when acquired.
+    token: Fencing token, strictly increasing per lock name. Downstream writes
+    should reject tokens lower than the highest they have seen.
+    lost: Set if the watchdog could not renew the lease.
+    """
+
+    def __init__(self, name: str, token: Optional[int] = None):
+        self.name = name
+        self.token = token
+        self.lost = asyncio.Event()
+
+    def __bool__(self):
+        return self.token is not None
+
+async def current_fence(redis: Redis, name: str) -> int:
+    """Highest fencing token handed out by distributed_lock for `name` so far"""
+    return int(await redis.get(f"lock:{name}:fence") or 0)
+
+async def _wait_for_release(pubsub, timeout: float):
+    """Return on the first release announcement, or after `timeout` seconds"""
+    deadline = time.monotonic() + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        if await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining):
+            return
+
 @asynccontextmanager
-async def distributed_lock(redis: Redis, name: str, timeout: int = 10, blocking_timeout: int = 2):
+async def _lease(redis: Redis, name: str, prefix: str, scripts: Tuple[str, str, str],
+                 keys: Tuple[List[str], List[str], List[str]], extra: List[Any],
+                 timeout: float, blocking_timeout: float, cancel_on_loss: bool, gate: Any):
     """
-    Robust distributed locking using Redis.
-    timeout: How long the lock is held (TTL) in seconds.
-    blocking_timeout: How long to wait to acquire the lock.
+    Shared acquire / renew / release machinery.
+    gate: Optional asyncio Lock or Semaphore taken before talking to Redis.
+    Between attempts, waiters sleep on the release channel instead of polling,
+    bounded by the holder's remaining lease in case it dies without releasing.
     """
-    key = f"lock:{name}"
-    lock = redis.lock(key, timeout=timeout, blocking_timeout=blocking_timeout)
-    
-    acquired = await lock.acquire()
-    
-    if not acquired:
-        logger.warning(f"Could not acquire lock: {name} (waited {blocking_timeout}s)")
+    acquire_src, renew_src, release_src = scripts
+    acquire_keys, renew_keys, release_keys = keys
+    channel = f"{prefix}:released"
+    owner = str(uuid.uuid4())
+    ttl_ms = int(timeout * 1000)
+    deadline = time.monotonic() + blocking_timeout
+
+    gated = False
+    token = None
+    pubsub = None
+    try:
+        if gate is not None:
+            try:
+                await asyncio.wait_for(gate.acquire(), timeout=blocking_timeout)
+                gated = True
+            except asyncio.TimeoutError:
+                pass
+        if gate is None or gated:
+            acquire = redis.register_script(acquire_src)
+            while True:
+                ok, value = await acquire(keys=acquire_keys, args=[owner, ttl_ms, int(time.time() * 1000), *extra])
+                if ok:
+                    token = int(value)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if pubsub is None:
+                    # Subscribe, then retry at once so a release in between isn't missed
+                    pubsub = redis.pubsub()
+                    await pubsub.subscribe(channel)
+                    continue
+                await _wait_for_release(pubsub, min(remaining, max(int(value), 10) / 1000))
+    finally:
+        if pubsub is not None:
+            await pubsub.close()
+        if gated and token is None:
+            gate.release()
+
+    lease = LockLease(name, token)
+    if not lease:
+        logger.warning(f"Could not acquire {prefix} (waited {blocking_timeout}s)")
         try:
-            yield False
+            yield lease
         except Exception:
             pass # Swallow exception if lock wasn't acquired to prevent confusing caller
         return
-        
+
+    body = asyncio.current_task()
+    watchdog = asyncio.create_task(
+        _renew(redis.register_script(renew_src), renew_keys, owner, ttl_ms, lease, body if cancel_on_loss else None)
+    )
     try:
-        logger.debug(f"Acquired lock: {name}")
-        yield True
+        logger.debug(f"Acquired {prefix} (fence {lease.token})")
+        yield lease
+    except asyncio.CancelledError:
+        if lease.lost.is_set() and cancel_on_loss:
+            body.uncancel()
+            raise LockLost(f"Lost {prefix} (fence {lease.token}) while holding it")
+        raise
     finally:
+        watchdog.cancel()
+        if gate is not None:
+            gate.release()
+        try:
+            # Only frees the lease if we still own it
+            await redis.register_script(release_src)(keys=release_keys, args=[owner, channel])
+        except Exception as e:
+            logger.debug(f"Release skipped/failed for {prefix}: {e}")
+
+async def _renew(renew, keys: List[str], owner: str, ttl_ms: int, lease: LockLease, body: Optional[asyncio.Task]):
+    """Extend the lease every ttl/3; flag (and optionally cancel the body) once it's gone"""
+    interval = ttl_ms / 3000
+    expires = time.monotonic() + ttl_ms / 1000
+    while True:
+        await asyncio.sleep(interval)
         try:
-            # Check ownership before releasing (handled by redis-py mainly, but safe practice)
-            await lock.release()
+            if await renew(keys=keys, args=[owner, ttl_ms, int(time.time() * 1000)]):
+                expires = time.monotonic() + ttl_ms / 1000
+                continue
+            logger.error(f"Lease {lease.name} (fence {lease.token}) was taken over")
         except Exception as e:
-            # Lock might have expired or been stolen
-            logger.debug(f"Lock release skipped/failed for {name}: {e}")
+            if time.monotonic() < expires - interval:
+                logger.warning(f"Lease {lease.name} renewal failed, retrying: {e}")
+                continue
+            logger.error(f"Lease {lease.name} (fence {lease.token}) expired during renewal failures: {e}")
+        lease.lost.set()
+        if body:
+            body.cancel()
+        return
+
+def distributed_lock(redis: Redis, name: str, timeout: int = 10, blocking_timeout: int = 2, cancel_on_loss: bool = True):
+    """
+    Robust distributed locking using Redis.
+    timeout: Lease TTL in seconds. A watchdog renews it every timeout/3 while
+    the body runs, so short TTLs are safe and a crashed holder frees it quickly.
+    blocking_timeout: How long to wait to acquire the lock.
+    cancel_on_loss: Cancel the body if the lease is lost; the block then
+    raises LockLost instead of CancelledError.
+    Coroutines in this process queue on a local asyncio.Lock first, so only one
+    of them contends in Redis at a time.
+    """
+    key = f"lock:{name}"
+    return _lease(
+        redis, name, key, (LOCK_ACQUIRE, LOCK_RENEW, LOCK_RELEASE),
+        ([key, f"{key}:fence"], [key], [key]), [],
+        timeout, blocking_timeout, cancel_on_loss, _local_gate("lock", name, asyncio.Lock)
+    )
+
+def distributed_semaphore(redis: Redis, name: str, limit: int, timeout: int = 10, blocking_timeout: int = 2, cancel_on_loss: bool = True):
+    """Counting semaphore: up to `limit` holders cluster-wide. Same API as distributed_lock."""
+    key = f"semaphore:{name}"
+    return _lease(
+        redis, name, key, (SEMAPHORE_ACQUIRE, ZSET_RENEW, ZSET_RELEASE),
+        ([key, f"{key}:fence"], [key], [key]), [limit],
+        timeout, blocking_timeout, cancel_on_loss, _local_gate("semaphore", name, lambda: asyncio.Semaphore(limit))
+    )
+
+def read_lock(redis: Redis, name: str, timeout: int = 10, blocking_timeout: int = 2, cancel_on_loss: bool = True):
+    """Shared side of a reader/writer lock. Same API as distributed_lock."""
+    prefix = f"rwlock:{name}"
+    keys = [f"{prefix}:readers", f"{prefix}:writer", f"{prefix}:intent", f"{prefix}:fence"]
+    return _lease(
+        redis, name, prefix, (READ_ACQUIRE, ZSET_RENEW, ZSET_RELEASE),
+        (keys, keys[:1], keys[:1]), [],
+        timeout, blocking_timeout, cancel_on_loss, None # Readers don't exclude each other
+    )
+
+def write_lock(redis: Redis, name: str, timeout: int = 10, blocking_timeout: int = 2, cancel_on_loss: bool = True):
+    """Exclusive side of a reader/writer lock. Same API as distributed_lock."""
+    prefix = f"rwlock:{name}"
+    keys = [f"{prefix}:readers", f"{prefix}:writer", f"{prefix}:intent", f"{prefix}:fence"]
+    return _lease(
+        redis, name, prefix, (WRITE_ACQUIRE, LOCK_RENEW, LOCK_RELEASE),
+        (keys, keys[1:2], keys[1:2]), [],
+        timeout, blocking_timeout, cancel_on_loss, _local_gate("write", name, asyncio.Lock)
+    )
@@ -1,40 +1,262 @@
 
+import asyncio
+import math
 import time
+import uuid
 import logging
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from services.mildlyawesome.events import event_bus
+from typing import Dict, List, Optional, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.mildlyawesome.redis_pools import redis_pools
 
 logger = logging.getLogger("mildlyawesome.middleware")
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, limit: int = 100, window: int = 60):
-        super().__init__(app)
+# KEYS: log zset   ARGV: now ms, window ms, limit, member
+# Returns {allowed, remaining, ms until a slot frees}
+SLIDING_WINDOW_LOG = """
+local now, window, limit = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    count = count + 1
+    allowed = 1
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local reset = window
+if oldest[2] then reset = tonumber(oldest[2]) + window - now end
+return {allowed, limit - count, reset}
+"""
+
+# KEYS: bucket hash   ARGV: now ms, capacity, window ms (time to refill from empty)
+# Returns {allowed, remaining, ms until the next token (denied) or until full (allowed)}
+TOKEN_BUCKET = """
+local now, capacity, window = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local rate = capacity / window
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(window))
+local reset
+if allowed == 1 then reset = (capacity - tokens) / rate else reset = (1 - tokens) / rate end
+return {allowed, math.floor(tokens), math.ceil(reset)}
+"""
+
+ALGORITHMS = {"sliding_window": SLIDING_WINDOW_LOG, "token_bucket": TOKEN_BUCKET}
+
+class RateLimitRule:
+    """`limit` requests per `window` seconds"""
+
+    def __init__(self, limit: int, window: int):
         self.limit = limit
         self.window = window
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+class _LocalWindow:
+    """One key's fixed-window state on this replica"""
+
+    __slots__ = ("key", "window", "index", "synced", "pending")
+
+    def __init__(self, key: str, window: int, index: int):
+        self.key = f"{key}:{index}"
+        self.window = window
+        self.index = index
+        self.synced = 0 # Cluster-wide count as of the last sync
+        self.pending = 0 # Hits admitted here and not yet pushed to Redis
+
+class LocalRateLimiter:
+    """
+    Approximate fixed-window limiter that keeps Redis off the hot path.
+    Hits are admitted from local state and pushed to Redis with INCRBY every
+    `sync_interval` seconds. Each replica admits at most max_overshoot // replicas
+    unsynced hits per key, so the cluster exceeds a limit by at most about
+    `max_overshoot` per window. Redis is called inline only when that local
+    budget runs out or the key is close to its limit.
+    """
+
+    def __init__(self, sync_interval: float = 0.25, max_overshoot: int = 10, replicas: int = 1):
+        self.sync_interval = sync_interval
+        self.local_budget = max(1, max_overshoot // max(1, replicas))
+        self._windows: Dict[str, _LocalWindow] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _window(self, key: str, rule: RateLimitRule, now: float) -> _LocalWindow:
+        index = int(now // rule.window)
+        state = self._windows.get(key)
+        if state is None or state.index != index:
+            state = self._windows[key] = _LocalWindow(key, rule.window, index)
+        return state
+
+    async def check(self, redis, key: str, rule: RateLimitRule) -> Tuple[int, int, int]:
+        """(allowed, remaining, reset ms), same contract as the exact scripts"""
+        if not self._task:
+            self._task = asyncio.create_task(self._sync_loop())
+        now = time.time()
+        state = self._window(key, rule, now)
+        reset_ms = int(((state.index + 1) * rule.window - now) * 1000)
+        used = state.synced + state.pending
+
+        if state.synced >= rule.limit:
+            return 0, 0, reset_ms # Counts only grow within a window
+        if state.pending < self.local_budget and used + self.local_budget <= rule.limit:
+            state.pending += 1
+            return 1, rule.limit - used - 1, reset_ms
+
+        # Near the limit or out of local budget: push this hit with the backlog and decide on the fresh count
+        hits, state.pending = state.pending + 1, 0
+        try:
+            count = (await self._push(redis, [(state, hits)]))[0]
+        except Exception:
+            state.pending += hits # Keep them for the next sync
+            raise
+        state.synced = max(state.synced, count)
+        return int(count <= rule.limit), max(0, rule.limit - count), reset_ms
+
+    async def _push(self, redis, batch: List[Tuple[_LocalWindow, int]]) -> List[int]:
+        """INCRBY each window key in one pipeline; returns the cluster-wide counts"""
+        async with redis.pipeline(transaction=False) as pipe:
+            for state, hits in batch:
+                pipe.incrby(state.key, hits)
+                pipe.expire(state.key, state.window * 2)
+            replies = await pipe.execute()
+        return [int(count) for count in replies[::2]]
+
+    async def sync(self, redis):
+        """
+        Push pending hits and read back cluster-wide counts for the keys that had them.
+        Keys with no local traffic are not refreshed: their stale count can only admit
+        one local budget before the next push returns the fresh one, which is the same
+        bound as between syncs, and keys near their limit already go to Redis inline.
+        """
+        now = time.time()
+        for key, state in list(self._windows.items()):
+            if not state.pending and now >= (state.index + 1) * state.window:
+                del self._windows[key] # Window over and nothing left to push
+        batch = [(state, state.pending) for state in self._windows.values() if state.pending]
+        if not batch:
+            return
+        for state, hits in batch:
+            state.pending -= hits # In flight; check() may add more meanwhile
+        try:
+            counts = await self._push(redis, batch)
+        except Exception:
+            for state, hits in batch:
+                state.pending += hits
+            raise
+        for (state, _), count in zip(batch, counts):
+            state.synced = max(state.synced, count)
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync(redis_pools.get("ratelimit"))
+            except Exception as e:
+                logger.error(f"Rate limit sync failed: {e}")
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI rate limiter: one EVALSHA per request, no BaseHTTPMiddleware wrapping.
+    Uses the "ratelimit" Redis pool, whose short timeouts make it fail open fast.
+    Clients are identified by API key header when the key is in api_keys, else by IP.
+    routes: Path-prefix overrides (longest prefix wins); each gets its own budget.
+    api_keys: Per-key overrides, taking precedence over routes.
+    Responses carry RateLimit-Limit / -Remaining / -Reset, plus Retry-After on 429.
+    Fails open if Redis is unavailable.
+    mode="approximate" swaps the per-request script for LocalRateLimiter
+    (fixed windows, bounded overshoot, Redis mostly off the request path).
+    """
+
+    def __init__(self, app: ASGIApp, limit: int = 100, window: int = 60, algorithm: str = "sliding_window",
+                 routes: Optional[Dict[str, RateLimitRule]] = None, api_keys: Optional[Dict[str, RateLimitRule]] = None,
+                 api_key_header: str = "x-api-key", mode: str = "exact", sync_interval: float = 0.25,
+                 max_overshoot: int = 10, replicas: int = 1):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        if mode not in ("exact", "approximate"):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+        self.app = app
+        self.default = RateLimitRule(limit, window)
+        self.algorithm = algorithm
+        self.routes = sorted((routes or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.api_keys = api_keys or {}
+        self.api_key_header = api_key_header.lower().encode()
+        self._redis = None
+        self._script = None
+        self._local = LocalRateLimiter(sync_interval, max_overshoot, replicas) if mode == "approximate" else None
+
+    def _resolve(self, scope: Scope) -> Tuple[str, RateLimitRule]:
+        """Pick the bucket key and rule for this request"""
+        api_key = next((v.decode("latin-1") for k, v in scope.get("headers", []) if k == self.api_key_header), None) # ASGI header encoding; never raises
+        if api_key in self.api_keys:
+            return f"ratelimit:key:{api_key}", self.api_keys[api_key]
+        # Unknown keys are client-chosen, so they never pick the bucket; that would let a rotating key dodge the limit
+        client = f"ip:{scope['client'][0] if scope.get('client') else 'unknown'}"
+        path = scope.get("path", "")
+        for prefix, rule in self.routes:
+            if path.startswith(prefix):
+                return f"ratelimit:{client}:{prefix}", rule
+        return f"ratelimit:{client}", self.default
+
+    async def _check(self, key: str, rule: RateLimitRule) -> Tuple[int, int, int]:
+        """(allowed, remaining, reset ms); raises if Redis is unavailable"""
+        redis = redis_pools.get("ratelimit")
+        if self._local:
+            return await self._local.check(redis, key, rule)
+        if redis is not self._redis:
+            self._redis, self._script = redis, redis.register_script(ALGORITHMS[self.algorithm])
+        now_ms = int(time.time() * 1000)
+        if self.algorithm == "sliding_window":
+            args = [now_ms, rule.window * 1000, rule.limit, f"{now_ms}-{uuid.uuid4().hex[:8]}"]
+        else:
+            args = [now_ms, rule.limit, rule.window * 1000]
+        allowed, remaining, reset_ms = await self._script(keys=[key], args=args)
+        return int(allowed), int(remaining), int(reset_ms)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        key, rule = self._resolve(scope)
         try:
-            client_ip = request.client.host
-            key = f"ratelimit:{client_ip}"
-            
-            # Using the shared Redis connection from EventBus
-            # Note: Orchestrator `startup` connects the bus, so redis should be available.
-            redis = event_bus.redis
-            
-            if redis:
-                # Use Redis atomic increment + expire
-                current = await redis.incr(key)
-                if current == 1:
-                    await redis.expire(key, self.window)
-                
-                if current > self.limit:
-                    logger.warning(f"Rate limit exceeded for {client_ip}")
-                    return Response(content="Rate limit exceeded", status_code=429)
-                    
+            allowed, remaining, reset_ms = await self._check(key, rule)
         except Exception as e:
             # Fail open if Redis is down (or log error)
             logger.error(f"Rate limit check failed: {e}")
-            
-        return await call_next(request)
+            return await self.app(scope, receive, send)
+
+        reset = max(0, math.ceil(reset_ms / 1000))
+        headers = [
+            (b"ratelimit-limit", str(rule.limit).encode()),
+            (b"ratelimit-remaining", str(max(0, remaining)).encode()),
+            (b"ratelimit-reset", str(reset).encode()),
+        ]
+
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {key}")
+            body = b"Rate limit exceeded"
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"retry-after", str(max(1, reset)).encode()),
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
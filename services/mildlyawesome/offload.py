@@ -0,0 +1,83 @@
+
+import asyncio
+import importlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Optional, Set
+from services.mildlyawesome.config import settings
+
+logger = logging.getLogger("mildlyawesome.offload")
+
+# Heavy imports paid once per worker process instead of on the first job
+DEFAULT_PRELOAD = ("numpy", "pandas", "matplotlib", "seaborn")
+
+def _warm(modules: Iterable[str]):
+    """Pool initializer: pre-import modules so jobs start hot"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg") # No display in workers
+    except ImportError:
+        pass
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Preload of {name} failed: {e}")
+
+def _noop() -> None:
+    return None
+
+class ProcessOffloader:
+    """
+    Runs CPU-bound callables in a ProcessPoolExecutor so they don't block the event loop.
+    Callables and arguments must be picklable (module-level functions, plain data).
+    At most `max_pending` jobs are queued or running; further callers wait.
+    warm: Spawn every worker at start() with `preload` imported; otherwise workers
+    are spawned on demand and import what their first job needs.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 preload: Iterable[str] = DEFAULT_PRELOAD, warm: bool = True):
+        self.max_workers = max_workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+        self.max_pending = max_pending or self.max_workers * 2
+        self.preload: Set[str] = set(preload)
+        self.warm = warm
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def add_preload(self, module: str):
+        """Import `module` in workers started after this call"""
+        self.preload.add(module)
+
+    async def start(self):
+        """Create the pool; with `warm`, spawn and warm all workers up front"""
+        if self._executor:
+            return
+        # spawn: forking a process that runs an event loop and exporter threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm if self.warm else None,
+            initargs=(sorted(self.preload),) if self.warm else (),
+        )
+        self._slots = asyncio.Semaphore(self.max_pending)
+        if self.warm:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(self._executor, _noop) for _ in range(self.max_workers)])
+        logger.info(f"Process pool ready: {self.max_workers} workers{'' if self.warm else ' (on demand)'}, {self.max_pending} max pending")
+
+    async def shutdown(self):
+        if self._executor:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func(*args) in the pool and return its result on the event loop"""
+        if not self._executor:
+            await self.start()
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+# Global offloader shared by handlers
+offloader = ProcessOffloader(max_workers=settings.offload_workers or None, warm=settings.offload_preload)
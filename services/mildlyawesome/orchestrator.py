@@ -65,19 +65,38 @@ async def lifespan(app: FastAPI):
     # Initialize DB
     from services.mildlyawesome.db import init_db
     await init_db()
+    from services.mildlyawesome.config import settings
+    if settings.vector_index:
+        # Concurrent build in the background; searches fall back to exact scans until it is valid
+        from services.mildlyawesome.vector import VectorStore, IndexSpec
+        spec = IndexSpec(settings.vector_index, settings.vector_index_distance, quantization=settings.vector_quantization)
+        app.state.index_build = asyncio.create_task(VectorStore().create_index(spec))
 
     # Connect Event Bus and Redis
     await event_bus.connect()
+    await event_bus.start_trimmer() # Time-window retention (XTRIM MINID) for streams that set max_age
+    if settings.event_outbox_size:
+        await event_bus.enable_outbox(
+            max_size=settings.event_outbox_size,
+            overflow=settings.event_outbox_overflow,
+            spill_path=settings.event_outbox_spill_path
+        )
     
+    # Create the process pool; with offload_preload it is spawned and warmed now, using the preloads routers registered at import
+    from services.mildlyawesome.offload import offloader
+    await offloader.start()
+
     # Start Background Worker
     worker = BackgroundWorker(event_bus)
     await worker.start()
+
+    if settings.vector_local_index:
+        from services.mildlyawesome.local_index import local_index
+        await local_index.start(event_bus)
     
-    app.state.redis = event_bus.redis # Reuse connection if possible or create new
-    
-    # If EventBus manages its own redis, we might still want a separate one or just access it
-    # For now, let's keep app.state.redis independent if needed, or link them.
-    # But simpler to just use event_bus.redis if we trust it.
+    # General-purpose client on its own pool; locks, breakers and bulkheads get redis_pools.get("locks")
+    from services.mildlyawesome.redis_pools import redis_pools
+    app.state.redis = redis_pools.get("cache")
     
     await event_bus.publish("system", "SYSTEM_STARTUP", {"version": "2.0.0", "mode": "orchestrator"})
     
@@ -90,7 +109,11 @@ async def lifespan(app: FastAPI):
     # Shutdown
     await event_bus.publish("system", "SYSTEM_SHUTDOWN", {})
     await worker.stop()
+    if settings.vector_local_index:
+        await local_index.stop() # Writes the snapshot when one is configured
+    await offloader.shutdown()
     await event_bus.disconnect()
+    await redis_pools.close()
     logger.info("Orchestrator Service Shutdown")
 
 app = FastAPI(
@@ -111,6 +134,9 @@ app.include_router(popmart_router, prefix="/api")
 app.include_router(resume_router, prefix="/api")
 app.include_router(pipeline_router, prefix="/api")
 
+# Expose /metrics (request metrics plus default-registry gauges such as event_bus_outbox_depth)
+Instrumentator().instrument(app).expose(app)
+
 @app.get("/api/health")
 async def health_check():
     health = {
@@ -125,9 +151,19 @@ async def health_check():
             health["artifact_git_sha"] = f.read().strip()
     return health
 
+@app.get("/api/events/streams")
+async def event_stream_stats():
+    """Length, memory usage and retention of the streams the worker serves"""
+    from services.mildlyawesome.registry import registry
+    return await event_bus.stream_stats(registry.streams + list(event_bus.retention))
+
 # Rate Limiting
 from services.mildlyawesome.middleware import RateLimitMiddleware
-app.add_middleware(RateLimitMiddleware, limit=100, window=60)
+from services.mildlyawesome.config import settings
+app.add_middleware(
+    RateLimitMiddleware, limit=100, window=60, mode=settings.rate_limit_mode,
+    max_overshoot=settings.rate_limit_max_overshoot, replicas=settings.rate_limit_replicas
+)
 
 # Telemetry
 from services.mildlyawesome.telemetry import setup_telemetry
@@ -144,6 +180,11 @@ async def brain_recall(query: str):
     """
     return await brain.recall(query)
 
+@app.get("/api/brain/indexes")
+async def brain_indexes():
+    """ANN indexes on the vector store: validity, size and build progress"""
+    return await brain.vector_store.index_status()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,192 @@
+
+import asyncio
+import base64
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("mildlyawesome.outbox")
+
+OUTBOX_DEPTH = Gauge("event_bus_outbox_depth", "Events buffered while Redis is unavailable", ["location"])
+OUTBOX_DROPPED = Counter("event_bus_outbox_dropped_total", "Events discarded by the drop_oldest overflow policy")
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+Entry = Tuple[str, Dict[str, Any]] # (stream, built message)
+
+def _dump(entry: Entry) -> str:
+    """One JSON line per entry; binary codec payloads are base64'd"""
+    stream, message = entry
+    fields = {k: v for k, v in message.items() if not isinstance(v, bytes)}
+    binary = {k: base64.b64encode(v).decode() for k, v in message.items() if isinstance(v, bytes)}
+    return json.dumps({"stream": stream, "fields": fields, "binary": binary}) + "\n"
+
+def _load(line: str) -> Entry:
+    record = json.loads(line)
+    message = record["fields"]
+    message.update({k: base64.b64decode(v) for k, v in record["binary"].items()})
+    return record["stream"], message
+
+class Outbox:
+    """
+    Bounded in-memory buffer for events that could not be written to Redis.
+    When full, `overflow` decides what happens to new events:
+      block: the publisher waits for the flusher to make room
+      drop_oldest: the oldest buffered event is discarded
+      spill: the event is appended to `spill_path` and replayed after the memory buffer
+    A background flusher retries delivery through `send` every `flush_interval`
+    seconds. Ordering is best-effort across memory and spill file.
+    """
+
+    def __init__(self, send: Callable[[List[Entry]], Awaitable[None]], max_size: int = 10000,
+                 overflow: str = "drop_oldest", spill_path: Optional[str] = None,
+                 flush_interval: float = 1.0, batch_size: int = 500):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if overflow == "spill" and not spill_path:
+            raise ValueError("spill overflow requires spill_path")
+        self.send = send
+        self.max_size = max_size
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer: Deque[Entry] = deque()
+        self._in_flight = 0 # Entries taken off the buffer by a running flush
+        self._room = asyncio.Condition()
+        self._spilled = self._count_spilled()
+        self._task: Optional[asyncio.Task] = None
+        self._report()
+
+    @property
+    def depth(self) -> int:
+        return self._buffered + self._spilled
+
+    @property
+    def _buffered(self) -> int:
+        return len(self._buffer) + self._in_flight
+
+    def _count_spilled(self) -> int:
+        """Lines in the spill file plus any replay left behind by a crash"""
+        count = 0
+        for path in (self.spill_path, f"{self.spill_path}.replay"):
+            if self.spill_path and os.path.exists(path):
+                with open(path) as f:
+                    count += sum(1 for _ in f)
+        return count
+
+    def _report(self):
+        OUTBOX_DEPTH.labels("memory").set(self._buffered)
+        OUTBOX_DEPTH.labels("spill").set(self._spilled)
+
+    async def put(self, stream: str, message: Dict[str, Any]):
+        """Buffer one event, applying the overflow policy if full"""
+        entry = (stream, message)
+        if self._buffered >= self.max_size:
+            if self.overflow == "block":
+                async with self._room:
+                    await self._room.wait_for(lambda: self._buffered < self.max_size)
+            elif self.overflow == "drop_oldest":
+                # In-flight entries are not droppable; if they are all that's left, the
+                # bound is enforced once the flush fails and puts them back
+                if self._buffer:
+                    self._drop_oldest()
+            else:
+                await asyncio.to_thread(self._spill, [entry])
+                self._report()
+                return
+        self._buffer.append(entry)
+        self._report()
+
+    def _drop_oldest(self):
+        dropped_stream, dropped = self._buffer.popleft()
+        OUTBOX_DROPPED.inc()
+        logger.warning(f"Outbox full, dropped {dropped.get('type')} for {dropped_stream}")
+
+    def _spill(self, entries: List[Entry]):
+        with open(self.spill_path, "a") as f:
+            f.writelines(_dump(entry) for entry in entries)
+        self._spilled += len(entries)
+
+    async def flush(self) -> int:
+        """Send buffered events, then the spill file. Stops at the first failed batch."""
+        sent = 0
+        while self._buffer:
+            # Take the batch off the buffer so a concurrent drop_oldest can't discard it mid-send
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._in_flight += len(batch)
+            try:
+                await self.send(batch)
+            except BaseException:
+                self._buffer.extendleft(reversed(batch))
+                if self.overflow == "drop_oldest":
+                    while len(self._buffer) > self.max_size:
+                        self._drop_oldest()
+                raise
+            finally:
+                self._in_flight -= len(batch)
+                self._report()
+            sent += len(batch)
+            async with self._room:
+                self._room.notify_all()
+        if self._spilled:
+            sent += await self._replay_spill()
+        return sent
+
+    async def _replay_spill(self) -> int:
+        """Replay the spill file; whatever fails stays on disk"""
+        replay_path = f"{self.spill_path}.replay"
+        if not os.path.exists(replay_path):
+            os.replace(self.spill_path, replay_path)
+        with open(replay_path) as f:
+            entries = [_load(line) for line in f if line.strip()]
+        sent = 0
+        try:
+            for i in range(0, len(entries), self.batch_size):
+                await self.send(entries[i:i + self.batch_size])
+                sent += len(entries[i:i + self.batch_size])
+        finally:
+            rest = entries[sent:]
+            os.remove(replay_path)
+            self._spilled = self._count_spilled()
+            if rest:
+                # Unsent entries go back in front of anything spilled meanwhile
+                newer = open(self.spill_path).read() if os.path.exists(self.spill_path) else ""
+                with open(self.spill_path, "w") as f:
+                    f.writelines(_dump(entry) for entry in rest)
+                    f.write(newer)
+                self._spilled += len(rest)
+            self._report()
+        return sent
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """Stop the flusher after one last delivery attempt"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Outbox final flush failed, {self.depth} events left: {e}")
+
+    async def _run_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self.depth:
+                continue
+            try:
+                sent = await self.flush()
+                logger.info(f"Outbox replayed {sent} events")
+            except Exception as e:
+                logger.warning(f"Outbox flush failed, {self.depth} events pending: {e}")
@@ -0,0 +1,108 @@
+
+import logging
+from typing import Any, Dict, Optional
+from redis.asyncio import BlockingConnectionPool, Redis
+from prometheus_client import Gauge
+from services.mildlyawesome.config import settings
+
+logger = logging.getLogger("mildlyawesome.redis_pools")
+
+POOL_CONNECTIONS = Gauge("redis_pool_connections", "Connections held by a named Redis pool", ["pool", "state"])
+POOL_MAX = Gauge("redis_pool_max_connections", "Connection cap of a named Redis pool", ["pool"])
+POOL_SATURATION = Gauge("redis_pool_saturation", "Share of a named Redis pool's connections in use (1.0 = callers wait)", ["pool"])
+
+class PoolSpec:
+    """
+    Sizing for one named pool.
+    pool_timeout: Seconds a caller waits for a free connection before ConnectionError.
+    socket_timeout: Per-command read timeout; None for pools that run blocking commands.
+    """
+
+    def __init__(self, max_connections: int, pool_timeout: float = 5.0, socket_timeout: Optional[float] = None,
+                 socket_connect_timeout: float = 2.0, decode_responses: bool = True):
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout
+        self.decode_responses = decode_responses
+
+    def __repr__(self):
+        return f"PoolSpec(max_connections={self.max_connections}, pool_timeout={self.pool_timeout}, socket_timeout={self.socket_timeout})"
+
+# Blocking XREADGROUP must not hit socket_timeout; the rate limiter should fail open fast;
+# lock waiters hold a pub/sub connection each; streams and the cache may hold binary values.
+DEFAULT_SPECS: Dict[str, PoolSpec] = {
+    "bus": PoolSpec(settings.redis_pool_bus_size, pool_timeout=5.0, socket_timeout=None, decode_responses=False),
+    "ratelimit": PoolSpec(settings.redis_pool_ratelimit_size, pool_timeout=0.05, socket_timeout=0.25),
+    "locks": PoolSpec(settings.redis_pool_locks_size, pool_timeout=2.0, socket_timeout=5.0),
+    "cache": PoolSpec(settings.redis_pool_cache_size, pool_timeout=1.0, socket_timeout=1.0, decode_responses=False),
+}
+
+def _in_use(pool: BlockingConnectionPool) -> int:
+    return len(getattr(pool, "_in_use_connections", ()))
+
+def _idle(pool: BlockingConnectionPool) -> int:
+    return len(getattr(pool, "_available_connections", ()))
+
+class RedisPools:
+    """
+    Named Redis clients, one connection pool each, so blocking stream reads,
+    rate-limit INCRs and lock polling don't queue behind each other.
+    Clients are created on first use and shared afterwards.
+    """
+
+    def __init__(self, redis_url: str = None, specs: Optional[Dict[str, PoolSpec]] = None):
+        self.redis_url = redis_url or settings.redis_url
+        self.specs = dict(DEFAULT_SPECS if specs is None else specs)
+        self._clients: Dict[str, Redis] = {}
+
+    def get(self, name: str, **overrides: Any) -> Redis:
+        """
+        Client for pool `name`. overrides (e.g. decode_responses) replace spec
+        fields, and only take effect when the pool is first created.
+        """
+        client = self._clients.get(name)
+        if client is None:
+            if name not in self.specs:
+                raise KeyError(f"Unknown Redis pool: {name}")
+            spec = self.specs[name]
+            options = {
+                "max_connections": spec.max_connections,
+                "timeout": spec.pool_timeout,
+                "socket_timeout": spec.socket_timeout,
+                "socket_connect_timeout": spec.socket_connect_timeout,
+                "decode_responses": spec.decode_responses,
+                **overrides,
+            }
+            pool = BlockingConnectionPool.from_url(self.redis_url, **options)
+            client = self._clients[name] = Redis(connection_pool=pool)
+            self._export(name, pool)
+            logger.info(f"Redis pool '{name}' created (max {options['max_connections']} connections)")
+        return client
+
+    def _export(self, name: str, pool: BlockingConnectionPool):
+        """Gauges are read at scrape time, so the request path pays nothing"""
+        POOL_MAX.labels(name).set(pool.max_connections)
+        POOL_CONNECTIONS.labels(name, "in_use").set_function(lambda: _in_use(pool))
+        POOL_CONNECTIONS.labels(name, "idle").set_function(lambda: _idle(pool))
+        POOL_SATURATION.labels(name).set_function(lambda: _in_use(pool) / pool.max_connections)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"in_use": _in_use(client.connection_pool), "idle": _idle(client.connection_pool),
+                   "max": client.connection_pool.max_connections}
+            for name, client in self._clients.items()
+        }
+
+    async def close(self):
+        """Disconnect every pool; later get() calls start fresh pools"""
+        for name, client in self._clients.items():
+            try:
+                await client.close()
+                await client.connection_pool.disconnect()
+            except Exception as e:
+                logger.warning(f"Redis pool '{name}' failed to close cleanly: {e}")
+        self._clients = {}
+
+# Global instance
+redis_pools = RedisPools()
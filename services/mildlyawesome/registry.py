@@ -0,0 +1,55 @@
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from services.mildlyawesome.offload import offloader
+
+logger = logging.getLogger("mildlyawesome.registry")
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class HandlerRegistry:
+    """
+    Dispatch table mapping (stream, event_type) to coroutine handlers.
+    Handlers receive the decoded event payload. Modules register at import time:
+
+        @registry.on("popmart", "RECON_REQUESTED")
+        async def handle_recon(payload): ...
+
+    cpu_bound=True registers a plain (sync, module-level) function instead; it runs
+    in the shared process pool so it can't block the event loop.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[Tuple[str, str], EventHandler] = {}
+
+    def register(self, stream: str, event_type: str, handler: EventHandler) -> EventHandler:
+        key = (stream, event_type)
+        if key in self._handlers and self._handlers[key] is not handler:
+            raise ValueError(f"Handler already registered for {event_type} on {stream}")
+        self._handlers[key] = handler
+        return handler
+
+    def on(self, stream: str, event_type: str, cpu_bound: bool = False) -> Callable[[Callable], Callable]:
+        """Decorator form of register"""
+        def decorator(handler: Callable) -> Callable:
+            if not cpu_bound:
+                return self.register(stream, event_type, handler)
+                
+            async def run_in_pool(payload: Dict[str, Any]) -> None:
+                await offloader.run(handler, payload)
+                
+            offloader.add_preload(handler.__module__)
+            self.register(stream, event_type, run_in_pool)
+            return handler # Keep the module attribute picklable by reference
+        return decorator
+
+    def get(self, stream: str, event_type: str) -> Optional[EventHandler]:
+        return self._handlers.get((stream, event_type))
+
+    @property
+    def streams(self) -> List[str]:
+        """Every stream with at least one handler, in registration order"""
+        return list(dict.fromkeys(stream for stream, _ in self._handlers))
+
+# Global registry
+registry = HandlerRegistry()
@@ -23,6 +23,9 @@ from fastapi import APIRouter, Response, BackgroundTasks
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime
+from services.mildlyawesome.registry import registry
+from services.mildlyawesome.offload import offloader
+from services.mildlyawesome.redis_pools import redis_pools
 
 router = APIRouter(prefix="/cannabis", tags=["cannabis"])
 
@@ -268,13 +271,41 @@ def run_analysis(dispensaries: List[Dispensary], title: str = "Market Analysis")
     
     return html
 
+def render_report(options: Dict) -> str:
+    """Synthetic data + run_analysis; CPU-bound, so callers send it to the process pool"""
+    dispensaries = generate_synthetic_dispensaries(n_dispensaries=options.get("n_dispensaries", 5))
+    return run_analysis(dispensaries, options.get("title", "Market Analysis"))
+
+offloader.add_preload(__name__) # Pool workers import this module up front
+
 # --- Endpoints ---
 
 @router.get("/report/demo", response_class=Response)
 async def get_demo_report():
     """Get a full HTML analysis report using synthetic data"""
-    dispensaries = generate_synthetic_dispensaries()
-    html_content = run_analysis(dispensaries, "Market Report: Los Angeles")
+    html_content = await offloader.run(render_report, {"title": "Market Report: Los Angeles"})
+    return Response(content=html_content, media_type="text/html")
+
+# Reports rendered off the request path by the worker live in the "cache" pool,
+# so any replica can serve them, and expire after REPORT_TTL seconds
+REPORT_TTL = 86400
+
+def _report_key(report_id: str) -> str:
+    return f"cannabis:report:{report_id}"
+
+@registry.on("cannabis", "REPORT_REQUESTED")
+async def handle_report_requested(payload: Dict):
+    """Render a synthetic market report and keep it for GET /report/{report_id}"""
+    report_id = payload.get("report_id") or f"report-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
+    html_content = await offloader.run(render_report, payload)
+    await redis_pools.get("cache").set(_report_key(report_id), html_content, ex=REPORT_TTL)
+
+@router.get("/report/{report_id}", response_class=Response)
+async def get_report(report_id: str):
+    """Fetch a report rendered from a REPORT_REQUESTED event"""
+    html_content = await redis_pools.get("cache").get(_report_key(report_id))
+    if html_content is None:
+        return Response(content="Report not found", status_code=404)
     return Response(content=html_content, media_type="text/html")
 
 @router.get("/map/demo", response_class=Response)
@@ -15,6 +15,7 @@ from fastapi import APIRouter, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime
+from services.mildlyawesome.registry import registry
 
 router = APIRouter(prefix="/pipeline", tags=["pipeline"])
 
@@ -44,15 +45,23 @@ async def run_lv_pipeline(req: PipelineRequest, background_tasks: BackgroundTask
     if not os.path.exists(PIPELINE_SCRIPT):
         raise HTTPException(status_code=500, detail=f"Pipeline script not found at {PIPELINE_SCRIPT}")
     
-    task_id = f"lv-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    task_id = start_lv_task(req)
+    background_tasks.add_task(execute_pipeline_task, task_id, build_lv_args(req))
     
-    # Construct args
+    return {"task_id": task_id, "status": "started"}
+
+def build_lv_args(req: PipelineRequest) -> List[str]:
+    """Construct the pipeline.mjs command line"""
     args = ["node", PIPELINE_SCRIPT, req.command]
     if req.mode:
         args.append(f"--mode={req.mode}")
     if req.label:
         args.append(f"--label={req.label}")
-        
+    return args
+
+def start_lv_task(req: PipelineRequest) -> str:
+    """Register a running task entry and return its id"""
+    task_id = f"lv-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     tasks[task_id] = TaskStatus(
         id=task_id,
         command=f"pipeline.mjs {req.command}",
@@ -60,10 +69,15 @@ async def run_lv_pipeline(req: PipelineRequest, background_tasks: BackgroundTask
         start_time=datetime.now().isoformat(),
         logs=["Starting pipeline task..."]
     )
-    
-    background_tasks.add_task(execute_pipeline_task, task_id, args)
-    
-    return {"task_id": task_id, "status": "started"}
+    return task_id
+
+@registry.on("pipeline", "LV_PIPELINE_RUN")
+async def handle_lv_pipeline_run(payload: Dict):
+    """Bus entry point: same as POST /lv-images/run, awaited to completion by the worker"""
+    if not os.path.exists(PIPELINE_SCRIPT):
+        raise FileNotFoundError(f"Pipeline script not found at {PIPELINE_SCRIPT}")
+    req = PipelineRequest(**payload)
+    await execute_pipeline_task(start_lv_task(req), build_lv_args(req))
 
 @router.get("/tasks/{task_id}")
 async def get_task_status(task_id: str):
@@ -7,6 +7,7 @@ import httpx
 import re
 import json
 from enum import Enum
+from services.mildlyawesome.registry import registry
 
 # Import logic from original script if possible, or reimplement
 # For now, reimplementing core parts to be importable
@@ -67,29 +68,36 @@ async def mock_recon_task(task_id: str, req: ReconRequest):
     tasks[task_id].progress = 1.0
     tasks[task_id].status = "completed"
 
+async def run_scraper_task(tid: str, request_params: ReconRequest):
+    from services.mildlyawesome.scrapers.popmart import PopmartScraper
+    
+    tasks[tid].status = "running"
+    scraper = PopmartScraper()
+    try:
+        results = await scraper.run_recon_task(request_params.dict())
+        tasks[tid].results = results["items"]
+        tasks[tid].progress = 1.0
+        tasks[tid].status = "completed"
+    except Exception as e:
+        tasks[tid].status = "failed"
+        # In real app store error
+
 @router.post("/recon", response_model=ReconStatus)
 async def start_recon(req: ReconRequest, background_tasks: BackgroundTasks):
     task_id = f"task_{dt.datetime.utcnow().timestamp()}"
     tasks[task_id] = ReconStatus(task_id=task_id, status="queued", progress=0.0)
     
-    from services.mildlyawesome.scrapers.popmart import PopmartScraper
-    
-    async def run_scraper_task(tid, request_params):
-        tasks[tid].status = "running"
-        scraper = PopmartScraper()
-        try:
-            results = await scraper.run_recon_task(request_params.dict())
-            tasks[tid].results = results["items"]
-            tasks[tid].progress = 1.0
-            tasks[tid].status = "completed"
-        except Exception as e:
-            tasks[tid].status = "failed"
-            # In real app store error
-    
     background_tasks.add_task(run_scraper_task, task_id, req)
     
     return tasks[task_id]
 
+@registry.on("popmart", "RECON_REQUESTED")
+async def handle_recon_requested(payload: Dict[str, Any]):
+    """Bus entry point: same recon as POST /recon, queued by another service"""
+    task_id = payload.get("task_id") or f"task_{dt.datetime.utcnow().timestamp()}"
+    tasks[task_id] = ReconStatus(task_id=task_id, status="queued", progress=0.0)
+    await run_scraper_task(task_id, ReconRequest(**{k: v for k, v in payload.items() if k != "task_id"}))
+
 @router.get("/recon/{task_id}", response_model=ReconStatus)
 async def get_recon_status(task_id: str):
     if task_id not in tasks:
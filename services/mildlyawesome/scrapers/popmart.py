@@ -7,6 +7,7 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 import httpx
 from selectolax.parser import HTMLParser
+from services.mildlyawesome.bulkhead import Bulkhead, BulkheadFull
 
 try:
     from playwright.async_api import async_playwright
@@ -16,6 +17,9 @@ except ImportError:
 
 logger = logging.getLogger("popmart_scraper")
 
+# Each stock check launches a Chromium; cap how many run at once per process
+chromium_bulkhead = Bulkhead("popmart-chromium", max_concurrent=3, max_queue=50, queue_timeout=120)
+
 class PopmartScraper:
     """
     Popmart Scraper Service
@@ -97,6 +101,14 @@ class PopmartScraper:
             finally:
                 await browser.close()
                 
+    async def check_stock_level_bounded(self, product_id: str) -> Dict[str, Any]:
+        """check_stock_level behind the Chromium bulkhead"""
+        try:
+            return await chromium_bulkhead.call(self.check_stock_level, product_id)
+        except BulkheadFull as e:
+            logger.warning(f"Stock check for {product_id} rejected: {e}")
+            return {"product_id": product_id, "error": str(e)}
+                
     async def run_recon_task(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Main entry point for full recon task"""
         logger.info(f"Starting recon task with params: {params}")
@@ -107,7 +119,7 @@ class PopmartScraper:
         # 2. Detail Check (concurrent)
         tasks = []
         for item in new_items:
-            tasks.append(self.check_stock_level(item['id']))
+            tasks.append(self.check_stock_level_bounded(item['id']))
             
         details = await asyncio.gather(*tasks)
         
@@ -1,43 +1,525 @@
 
-from typing import List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 from sqlmodel import SQLModel, Field, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import Column, Integer, cast, column, delete, func, insert, literal, literal_column, select as sa_select, text, true, values
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import aliased
+from services.mildlyawesome.config import settings
 from services.mildlyawesome.db import engine
+import ast
+import json
 import logging
+import time
 
 logger = logging.getLogger("vector_store")
 
+# (content, embedding, metadata) as accepted by VectorStore.bulk_ingest
+IngestRow = Tuple[str, Sequence[float], Optional[Dict[str, Any]]]
+
+INGEST_METHODS = ("copy", "executemany")
+
+DIM = 1536 # OpenAI dimension
+
+# Distance name -> pgvector operator class; an index only serves queries using its operator
+DISTANCE_OPCLASSES = {"l2": "vector_l2_ops", "cosine": "vector_cosine_ops", "ip": "vector_ip_ops"}
+# Distance name -> pgvector comparator (<->, <=>, <#>); smaller is closer for all three
+DISTANCE_OPERATORS = {"l2": "l2_distance", "cosine": "cosine_distance", "ip": "max_inner_product"}
+INDEX_METHODS = ("hnsw", "ivfflat")
+# none: index full float32 vectors
+# halfvec: index embedding::halfvec (half the index size), re-rank candidates on full vectors
+# binary: index binary_quantize(embedding)::bit, Hamming prefilter (1/32 the size), re-rank on full vectors
+QUANTIZATIONS = ("none", "halfvec", "binary")
+
+# Stream carrying CHUNKS_CHANGED {"added": [ids], "deleted": [ids]} for per-process caches (see local_index.py)
+CHANGE_STREAM = "vector"
+
 class DocumentChunk(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     content: str
-    metadata_json: str = "{}" # JSON string
-    embedding: List[float] = Field(sa_column=Column(Vector(1536))) # OpenAI dimension
+    metadata_json: Dict[str, Any] = Field(
+        default_factory=dict, sa_column=Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    )
+    embedding: List[float] = Field(sa_column=Column(Vector(DIM)))
+    # content_tsv (generated tsvector for full-text search) is added by migrate_schema and never loaded
+
+TABLE = DocumentChunk.__tablename__
+CONTENT_TSV = literal_column(f"{TABLE}.content_tsv")
+
+def _parse_legacy_metadata(value: Optional[str]) -> Dict[str, Any]:
+    """Old rows hold str(dict), a Python repr; newer ones JSON"""
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        parsed = ast.literal_eval(value)
+        return parsed if isinstance(parsed, dict) else {"value": parsed}
+    except (ValueError, SyntaxError):
+        return {"raw": value}
+
+async def migrate_schema(conn):
+    """
+    Bring an existing documentchunk table up to date; idempotent, runs inside init_db.
+    Converts metadata_json from repr text to JSONB, adds the generated content_tsv
+    column, and the GIN indexes that filters (@>) and full-text (@@) use.
+    """
+    column_type = (await conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table AND column_name = 'metadata_json'"
+    ), {"table": TABLE})).scalar()
+    # The baseline model (metadata_json: str) was created by SQLModel as VARCHAR; accept text too
+    if column_type in ("character varying", "text"):
+        logger.info(f"Migrating {TABLE}.metadata_json to JSONB")
+        rows = (await conn.execute(text(f"SELECT id, metadata_json FROM {TABLE}"))).all()
+        await conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN metadata_json DROP DEFAULT"))
+        if rows:
+            await conn.execute(text(f"UPDATE {TABLE} SET metadata_json = :meta WHERE id = :id"), [
+                {"id": row.id, "meta": json.dumps(_parse_legacy_metadata(row.metadata_json))} for row in rows
+            ])
+        await conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN metadata_json TYPE jsonb USING metadata_json::jsonb"))
+        await conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN metadata_json SET DEFAULT '{{}}'::jsonb"))
+    await conn.execute(text(
+        f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('english', content)) STORED"
+    ))
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {TABLE}_metadata_gin ON {TABLE} USING gin (metadata_json jsonb_path_ops)"))
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {TABLE}_content_tsv_gin ON {TABLE} USING gin (content_tsv)"))
+
+class IngestStats:
+    """Outcome of one VectorStore.bulk_ingest call"""
+
+    def __init__(self, method: str, rows: int = 0, batches: int = 0, seconds: float = 0.0):
+        self.method = method
+        self.rows = rows
+        self.batches = batches
+        self.seconds = seconds
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return f"IngestStats(method={self.method}, rows={self.rows}, batches={self.batches}, rows_per_second={self.rows_per_second:.0f})"
+
+class IndexSpec:
+    """
+    ANN index on DocumentChunk.embedding.
+    hnsw: m (graph degree) and ef_construction (build-time candidate list).
+    ivfflat: lists; None picks rows/1000 (sqrt(rows) past 1M rows) at build time.
+    IVFFlat centroids come from the rows present at build, so build it after loading data.
+    quantization: halfvec / binary build an expression index over the existing
+    full-precision column, so no data migration is needed (see QUANTIZATIONS).
+    """
+
+    def __init__(self, method: str = "hnsw", distance: str = "l2", m: int = 16, ef_construction: int = 64,
+                 lists: Optional[int] = None, quantization: str = "none"):
+        if method not in INDEX_METHODS:
+            raise ValueError(f"Unknown index method: {method}")
+        if distance not in DISTANCE_OPCLASSES:
+            raise ValueError(f"Unknown distance: {distance}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.method = method
+        self.distance = distance
+        self.m = m
+        self.ef_construction = ef_construction
+        self.lists = lists
+        self.quantization = quantization
+
+    @property
+    def name(self) -> str:
+        suffix = "" if self.quantization == "none" else f"_{self.quantization}"
+        return f"{DocumentChunk.__tablename__}_embedding_{self.method}_{self.distance}{suffix}"
+
+    @property
+    def expression(self) -> str:
+        """Indexed expression and opclass; must match what VectorStore orders by"""
+        if self.quantization == "halfvec":
+            return f"(embedding::halfvec({DIM})) {DISTANCE_OPCLASSES[self.distance].replace('vector_', 'halfvec_')}"
+        if self.quantization == "binary":
+            return f"(binary_quantize(embedding)::bit({DIM})) bit_hamming_ops"
+        return f"embedding {DISTANCE_OPCLASSES[self.distance]}"
+
+    def ddl(self, rows: int = 0, concurrently: bool = True) -> str:
+        if self.method == "hnsw":
+            params = f"m = {int(self.m)}, ef_construction = {int(self.ef_construction)}"
+        else:
+            lists = self.lists or max(1, int(rows ** 0.5) if rows > 1_000_000 else rows // 1000)
+            params = f"lists = {int(lists)}"
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {self.name} "
+            f"ON {DocumentChunk.__tablename__} USING {self.method} ({self.expression}) "
+            f"WITH ({params})"
+        )
+
+    def __repr__(self):
+        return (
+            f"IndexSpec(method={self.method}, distance={self.distance}, m={self.m}, "
+            f"ef_construction={self.ef_construction}, lists={self.lists}, quantization={self.quantization})"
+        )
+
+def _distance(embedding_column, query, distance: str):
+    return getattr(embedding_column, DISTANCE_OPERATORS[distance])(query)
+
+class SearchHit:
+    """A chunk and its distance to the query under `distance`"""
+
+    __slots__ = ("chunk", "distance", "metric")
+
+    def __init__(self, chunk: DocumentChunk, distance: float, metric: str):
+        self.chunk = chunk
+        self.distance = distance
+        self.metric = metric
+
+    @property
+    def similarity(self) -> float:
+        """Higher is closer: 1/(1+d) for L2, 1-d for cosine, the inner product for ip (<#> is its negative)"""
+        if self.metric == "l2":
+            return 1.0 / (1.0 + self.distance)
+        if self.metric == "cosine":
+            return 1.0 - self.distance
+        return -self.distance
+
+    def __repr__(self):
+        return f"SearchHit(id={self.chunk.id}, {self.metric}={self.distance:.4f})"
+
+def _chunked(rows: Iterable[IngestRow], size: int) -> Iterable[List[IngestRow]]:
+    it = iter(rows)
+    while batch := list(islice(it, size)):
+        yield batch
 
 class VectorStore:
     """
     Manages vector embeddings and semantic search.
+    ef_search / probes: Default per-query recall knobs for HNSW / IVFFlat
+    indexes (None keeps the server setting); search() can override them.
+    iterative_scan: "relaxed_order" or "strict_order" lets filtered HNSW/IVFFlat
+    scans keep going until `limit` rows pass the filter (pgvector >= 0.8).
+    distance: l2 | cosine | ip, defaulting to settings.vector_index_distance so
+    queries match the index opclass; searches can override it.
+    announce_changes: Publish CHUNKS_CHANGED on CHANGE_STREAM after writes so
+    local indexes stay in sync (settings.vector_local_index by default).
+    quantization: Which index kind searches target (settings.vector_quantization
+    by default). With halfvec / binary, limit * rerank_factor candidates come
+    from the compact index and are re-ranked on the full-precision column, so
+    returned distances are always exact.
     """
+
+    def __init__(self, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                 iterative_scan: Optional[str] = None, distance: Optional[str] = None,
+                 quantization: Optional[str] = None, rerank_factor: Optional[int] = None,
+                 announce_changes: Optional[bool] = None):
+        self.ef_search = ef_search
+        self.probes = probes
+        self.iterative_scan = iterative_scan
+        self.distance = distance or settings.vector_index_distance
+        if self.distance not in DISTANCE_OPERATORS:
+            raise ValueError(f"Unknown distance: {self.distance}")
+        self.quantization = quantization or settings.vector_quantization
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {self.quantization}")
+        self.rerank_factor = rerank_factor or settings.vector_rerank_factor
+        self.announce_changes = settings.vector_local_index if announce_changes is None else announce_changes
+
+    async def _announce(self, added: Sequence[int] = (), deleted: Sequence[int] = ()):
+        """Best effort: a missed event leaves local indexes stale until their next reload"""
+        if not self.announce_changes or not (added or deleted):
+            return
+        try:
+            from services.mildlyawesome.events import event_bus
+            await event_bus.publish(CHANGE_STREAM, "CHUNKS_CHANGED", {"added": list(added), "deleted": list(deleted)})
+        except Exception as e:
+            logger.warning(f"Failed to announce vector changes: {e}")
     
     async def add_documents(self, documents: List[str], embeddings: List[List[float]], metadatas: List[dict] = None):
         """Add documents and embeddings to store"""
         async with AsyncSession(engine) as session:
             for i, doc in enumerate(documents):
-                meta = str(metadatas[i]) if metadatas else "{}"
+                meta = metadatas[i] if metadatas else {}
                 chunk = DocumentChunk(
                     content=doc,
                     embedding=embeddings[i],
                     metadata_json=meta
                 )
                 session.add(chunk)
+            chunks = list(session.new)
+            await session.flush()
+            ids = [chunk.id for chunk in chunks]
             await session.commit()
             logger.info(f"Added {len(documents)} documents to vector store.")
+        await self._announce(added=ids)
+        return ids
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        """Delete chunks by id; returns how many rows went"""
+        async with AsyncSession(engine) as session:
+            result = await session.execute(delete(DocumentChunk).where(DocumentChunk.id.in_(list(ids))))
+            await session.commit()
+        await self._announce(deleted=ids)
+        return result.rowcount
+
+    async def bulk_ingest(self, rows: Iterable[IngestRow], batch_size: int = 5000, method: str = "copy") -> IngestStats:
+        """
+        Insert (content, embedding, metadata) rows without the ORM.
+        rows may be a generator; it is consumed `batch_size` rows at a time and
+        each batch commits on its own, so memory stays flat and a failure keeps
+        earlier batches.
+        copy: asyncpg COPY with pgvector's binary vector codec (fastest).
+        executemany: batched INSERT, for setups where COPY isn't permitted.
+        """
+        if method not in INGEST_METHODS:
+            raise ValueError(f"Unknown ingest method: {method}")
+        stats = IngestStats(method)
+        start = time.perf_counter()
+        if method == "copy":
+            await self._copy_ingest(rows, batch_size, stats)
+        else:
+            async with engine.connect() as conn:
+                for batch in _chunked(rows, batch_size):
+                    async with conn.begin():
+                        result = await conn.execute(insert(DocumentChunk.__table__).returning(DocumentChunk.__table__.c.id), [
+                            {"content": content, "embedding": embedding, "metadata_json": meta or {}} for content, embedding, meta in batch
+                        ])
+                        ids = list(result.scalars())
+                    await self._announce(added=ids)
+                    stats.rows += len(batch)
+                    stats.batches += 1
+        stats.seconds = time.perf_counter() - start
+        logger.info(f"Bulk ingest finished: {stats}")
+        return stats
+
+    async def _copy_ingest(self, rows: Iterable[IngestRow], batch_size: int, stats: IngestStats):
+        """
+        COPY batches over a dedicated asyncpg connection. pgvector's binary codec
+        replaces the text one SQLAlchemy binds vectors with, so it must never be
+        registered on a connection that goes back to the engine's pool.
+        """
+        import asyncpg
+        from pgvector.asyncpg import register_vector
+        raw = await asyncpg.connect(engine.url.set(drivername="postgresql").render_as_string(hide_password=False))
+        try:
+            await register_vector(raw)
+            sequence = await raw.fetchval("SELECT pg_get_serial_sequence($1, 'id')", DocumentChunk.__tablename__)
+            for batch in _chunked(rows, batch_size):
+                # Ids are drawn up front so the batch can be announced; asyncpg takes jsonb as text
+                ids = [row[0] for row in await raw.fetch(
+                    "SELECT nextval($1::regclass) FROM generate_series(1, $2)", sequence, len(batch)
+                )]
+                records = [(i, content, embedding, json.dumps(meta or {})) for i, (content, embedding, meta) in zip(ids, batch)]
+                # A single COPY statement is atomic on its own
+                await raw.copy_records_to_table(
+                    DocumentChunk.__tablename__, records=records, columns=["id", "content", "embedding", "metadata_json"]
+                )
+                await self._announce(added=ids)
+                stats.rows += len(batch)
+                stats.batches += 1
+        finally:
+            await raw.close()
+
+    async def create_index(self, spec: IndexSpec, concurrently: bool = True, maintenance_work_mem: Optional[str] = None):
+        """
+        Build `spec` unless a valid index of that name exists. Concurrent builds
+        don't block writes; one that failed leaves an INVALID index, which is
+        dropped and rebuilt here.
+        maintenance_work_mem (e.g. "2GB"): HNSW builds are much faster when the graph fits.
+        """
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT") # CONCURRENTLY can't run in a transaction
+            valid = (await conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ), {"name": spec.name})).scalar()
+            if valid:
+                logger.info(f"Index {spec.name} already exists")
+                return
+            if valid is False:
+                logger.warning(f"Index {spec.name} is INVALID (interrupted build), rebuilding")
+                await conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {spec.name}"))
+            rows = 0
+            if spec.method == "ivfflat" and not spec.lists:
+                rows = (await conn.execute(text(f"SELECT count(*) FROM {DocumentChunk.__tablename__}"))).scalar()
+            if maintenance_work_mem:
+                await conn.execute(text(f"SET maintenance_work_mem = '{maintenance_work_mem}'"))
+            start = time.perf_counter()
+            logger.info(f"Building index {spec}")
+            await conn.execute(text(spec.ddl(rows, concurrently)))
+            logger.info(f"Index {spec.name} built in {time.perf_counter() - start:.1f}s")
+
+    async def migrate_quantization(self, spec: IndexSpec, drop_previous: bool = True, **build_options):
+        """
+        Move this store to spec.quantization without touching rows: build the
+        quantized expression index concurrently, switch searches over, then drop
+        the index of the same method/distance that was serving them.
+        """
+        previous = IndexSpec(spec.method, spec.distance, quantization=self.quantization)
+        await self.create_index(spec, **build_options)
+        self.quantization = spec.quantization
+        if drop_previous and previous.name != spec.name:
+            await self.drop_index(previous)
+            logger.info(f"Dropped {previous.name}; searches now use {spec.name}")
+
+    async def drop_index(self, spec: IndexSpec, concurrently: bool = True):
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {spec.name}"))
 
-    async def search(self, query_embedding: List[float], limit: int = 5) -> List[DocumentChunk]:
-        """Semantic search using vector similarity (L2 distance)"""
+    async def index_status(self) -> List[Dict[str, Any]]:
+        """Vector indexes on DocumentChunk: definition, validity, size, and build progress while building"""
+        async with engine.connect() as conn:
+            result = await conn.execute(text("""
+                SELECT c.relname AS name, am.amname AS method, i.indisvalid AS valid, i.indisready AS ready,
+                       pg_relation_size(c.oid) AS size_bytes, pg_get_indexdef(c.oid) AS definition,
+                       p.phase, p.blocks_done, p.blocks_total, p.tuples_done, p.tuples_total
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_am am ON am.oid = c.relam
+                LEFT JOIN pg_stat_progress_create_index p ON p.index_relid = c.oid
+                WHERE i.indrelid = CAST(:table AS regclass) AND am.amname IN ('hnsw', 'ivfflat')
+            """), {"table": DocumentChunk.__tablename__})
+            return [dict(row._mapping) for row in result]
+
+    async def _tune(self, session: AsyncSession, ef_search: Optional[int], probes: Optional[int], filtered: bool = False):
+        """SET LOCAL the recall knobs for this transaction only"""
+        ef_search = ef_search or self.ef_search
+        probes = probes or self.probes
+        if ef_search:
+            await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if probes:
+            await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+        if filtered and self.iterative_scan:
+            await session.execute(text(f"SET LOCAL hnsw.iterative_scan = '{self.iterative_scan}'"))
+            await session.execute(text(f"SET LOCAL ivfflat.iterative_scan = '{self.iterative_scan}'"))
+
+    @staticmethod
+    def _where(metadata_filter: Optional[Dict[str, Any]], entity: Any = DocumentChunk) -> list:
+        """JSONB containment (@>), served by the jsonb_path_ops GIN index"""
+        return [entity.metadata_json.contains(metadata_filter)] if metadata_filter else []
+
+    def _knn(self, entity: Any, query: Any, distance: str, limit: int, metadata_filter: Optional[Dict[str, Any]]):
+        """
+        SELECT id, exact distance for the nearest rows of `entity` to `query` (a
+        vector or a column). Quantized stores order by the compact index's expression
+        and over-fetch limit * rerank_factor rows; callers keep the best `limit` by distance.
+        """
+        exact = _distance(entity.embedding, query, distance)
+        if self.quantization == "none":
+            order, fetch = exact, limit
+        else:
+            if not isinstance(query, ColumnElement):
+                query = literal(list(query), Vector(DIM))
+            if self.quantization == "halfvec":
+                order = _distance(cast(entity.embedding, HALFVEC(DIM)), cast(query, HALFVEC(DIM)), distance)
+            else:
+                order = cast(func.binary_quantize(entity.embedding), BIT(DIM)).hamming_distance(
+                    cast(func.binary_quantize(query), BIT(DIM))
+                )
+            fetch = limit * self.rerank_factor
+        return (
+            sa_select(entity.id, exact.label("distance"))
+            .where(*self._where(metadata_filter, entity))
+            .order_by(order)
+            .limit(fetch)
+        )
+
+    async def search(self, query_embedding: List[float], limit: int = 5, metadata_filter: Optional[Dict[str, Any]] = None,
+                     ef_search: Optional[int] = None, probes: Optional[int] = None,
+                     distance: Optional[str] = None) -> List[DocumentChunk]:
+        """
+        Semantic search using vector similarity (the store's distance unless given).
+        metadata_filter: Only rows whose metadata contains these key/values, e.g. {"source": "popmart"}.
+        Applied in the same query, so the planner can pick the ANN index or the GIN index.
+        ef_search / probes trade latency for recall when an ANN index serves the query.
+        """
+        knn = self._knn(DocumentChunk, query_embedding, distance or self.distance, limit, metadata_filter).subquery()
+        statement = (
+            select(DocumentChunk)
+            .join(knn, DocumentChunk.id == knn.c.id)
+            .order_by(knn.c.distance)
+            .limit(limit)
+        )
         async with AsyncSession(engine) as session:
-            # Order by L2 distance ( <-> operator )
-            statement = select(DocumentChunk).order_by(DocumentChunk.embedding.l2_distance(query_embedding)).limit(limit)
+            await self._tune(session, ef_search, probes, filtered=bool(metadata_filter))
             results = await session.execute(statement)
             return results.scalars().all()
+
+    async def search_many(self, query_embeddings: Sequence[Sequence[float]], limit: int = 5,
+                          metadata_filter: Optional[Dict[str, Any]] = None, ef_search: Optional[int] = None,
+                          probes: Optional[int] = None, distance: Optional[str] = None) -> List[List[SearchHit]]:
+        """
+        Top `limit` hits for each query vector in one round-trip: the queries go in
+        as a VALUES list and a LATERAL subquery runs the (index-backed) k-NN per row.
+        Returns one list of SearchHit per query, in query order, closest first.
+        """
+        if len(query_embeddings) == 0: # May be a NumPy array
+            return []
+        distance = distance or self.distance
+        # Cast explicitly: an untyped VALUES parameter is inferred as text, and vector <-> text doesn't exist
+        queries = values(column("qid", Integer), column("embedding", Vector(DIM)), name="queries").data(
+            [(i, cast(literal(list(embedding), Vector(DIM)), Vector(DIM))) for i, embedding in enumerate(query_embeddings)]
+        )
+        candidate = aliased(DocumentChunk, name="candidate")
+        knn = self._knn(candidate, queries.c.embedding, distance, limit, metadata_filter).lateral("knn")
+        # Keep the best `limit` per query (quantized stores over-fetch for re-ranking)
+        ranked = sa_select(
+            queries.c.qid, knn.c.id, knn.c.distance,
+            func.row_number().over(partition_by=queries.c.qid, order_by=knn.c.distance).label("rank"),
+        ).select_from(queries).join(knn, true()).subquery()
+        statement = (
+            select(ranked.c.qid, DocumentChunk, ranked.c.distance)
+            .join(DocumentChunk, DocumentChunk.id == ranked.c.id)
+            .where(ranked.c.rank <= limit)
+            .order_by(ranked.c.qid, ranked.c.distance)
+        )
+        hits: List[List[SearchHit]] = [[] for _ in query_embeddings]
+        async with AsyncSession(engine) as session:
+            await self._tune(session, ef_search, probes, filtered=bool(metadata_filter))
+            for qid, chunk, dist in (await session.execute(statement)).all():
+                hits[qid].append(SearchHit(chunk, float(dist), distance))
+        return hits
+
+    async def hybrid_search(self, query: str, query_embedding: List[float], limit: int = 5,
+                            metadata_filter: Optional[Dict[str, Any]] = None, candidates: int = 50,
+                            rrf_k: int = 60, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                            distance: Optional[str] = None) -> List[Tuple[DocumentChunk, float]]:
+        """
+        Full-text + vector search fused with reciprocal rank fusion, in one query.
+        The top `candidates` of each ranking (tsvector ts_rank_cd, and vector distance)
+        score 1 / (rrf_k + rank) each; rows are returned with their summed score.
+        """
+        where = self._where(metadata_filter)
+        vector_hits = self._knn(DocumentChunk, query_embedding, distance or self.distance, candidates, metadata_filter).subquery()
+        semantic = sa_select(
+            vector_hits.c.id, func.row_number().over(order_by=vector_hits.c.distance).label("rank")
+        ).order_by(vector_hits.c.distance).limit(candidates).cte("semantic")
+
+        tsquery = func.websearch_to_tsquery("english", query)
+        text_rank = func.ts_rank_cd(CONTENT_TSV, tsquery)
+        text_hits = (
+            sa_select(DocumentChunk.id, text_rank.label("score"))
+            .where(CONTENT_TSV.op("@@")(tsquery), *where).order_by(text_rank.desc()).limit(candidates).subquery()
+        )
+        lexical = sa_select(
+            text_hits.c.id, func.row_number().over(order_by=text_hits.c.score.desc()).label("rank")
+        ).cte("lexical")
+
+        fused = sa_select(
+            func.coalesce(semantic.c.id, lexical.c.id).label("id"),
+            (func.coalesce(literal(1.0) / (rrf_k + semantic.c.rank), 0)
+             + func.coalesce(literal(1.0) / (rrf_k + lexical.c.rank), 0)).label("score"),
+        ).select_from(semantic.outerjoin(lexical, semantic.c.id == lexical.c.id, full=True)).subquery()
+
+        statement = (
+            select(DocumentChunk, fused.c.score)
+            .join(fused, DocumentChunk.id == fused.c.id)
+            .order_by(fused.c.score.desc())
+            .limit(limit)
+        )
+        async with AsyncSession(engine) as session:
+            await self._tune(session, ef_search, probes, filtered=bool(metadata_filter))
+            results = await session.execute(statement)
+            return [(chunk, float(score)) for chunk, score in results.all()]
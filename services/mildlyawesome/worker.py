@@ -3,8 +3,9 @@ import asyncio
 import logging
 import uuid
 import json
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, Optional, List
 from .events import EventBus
+from .registry import HandlerRegistry, registry as default_registry
 
 logger = logging.getLogger("worker")
 
@@ -12,72 +13,169 @@ class BackgroundWorker:
     """
     Background worker that consumes events from Redis Streams.
     Replaces legacy Arq worker with native EventBus consumption.
+    Every stream with a registered handler is served by one blocking XREADGROUP.
     """
     
-    def __init__(self, event_bus: EventBus):
+    def __init__(self, event_bus: EventBus, concurrency: int = 1, partition_field: Optional[str] = None,
+                 registry: Optional[HandlerRegistry] = None, streams: Optional[List[str]] = None):
         self.event_bus = event_bus
+        self.registry = registry or default_registry
         self.running = False
         self.consumer_name = f"worker-{str(uuid.uuid4())[:8]}"
         self.group_name = "orchestrator_workers"
-        self.stream_name = "system"
+        self.streams = streams # None: resolved from the registry at start()
+        self.batch_size = 100
+        self.block_ms = 5000 # XREADGROUP BLOCK timeout; bounds shutdown latency when idle
+        self.concurrency = concurrency # In-flight handlers; >1 switches to the concurrent consumer
+        self.partition_field = partition_field # Payload field whose values must stay serialized
+        self.handler_timeout = 600 # Seconds a handler may run (LV pipeline runs, recon) before it counts as failed
+        self.reclaim_interval = 30 # Seconds between PEL sweeps
+        self.reclaim_min_idle_ms = 1200000 # Retry/takeover delay; must stay well above handler_timeout
+        self.heartbeat_interval = 10 # Seconds between liveness beats
+        self.consumer_timeout_ms = 60000 # Without a beat this long, a consumer's entries may be taken over
+        self.max_deliveries = 5 # Attempts before a message is dead-lettered
+        self.dead_letter_suffix = ":dead" # Poison messages from <stream> go to <stream>:dead
+        self.consumer_idle_ms = 3600000 # Empty consumers idle this long are removed from the group
         self._task = None
+        self._reclaim_task = None
+        self._heartbeat_task = None
         
     async def start(self):
         """Start the background worker"""
+        if self.reclaim_min_idle_ms <= self.handler_timeout * 1000:
+            raise ValueError(
+                f"reclaim_min_idle_ms ({self.reclaim_min_idle_ms}) must exceed handler_timeout ({self.handler_timeout}s), "
+                "or entries could be retried while their first run is still going"
+            )
         self.running = True
         
-        # Ensure group exists
-        await self.event_bus.create_group(self.stream_name, self.group_name)
+        if self.streams is None:
+            self.streams = self.registry.streams
+            
+        # Ensure groups exist
+        for stream in self.streams:
+            await self.event_bus.create_group(stream, self.group_name)
+            if self.event_bus.local_delivery:
+                self.event_bus.subscribe_local(stream, self.handle_event)
         
+        await self.event_bus.heartbeat(self.group_name, self.consumer_name)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
         self._task = asyncio.create_task(self._run_loop())
+        self._reclaim_task = asyncio.create_task(self._reclaim_loop())
         logger.info(f"BackgroundWorker started: {self.consumer_name}")
         
     async def stop(self):
         """Stop the background worker"""
         self.running = False
-        if self._task:
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._task, self._reclaim_task, self._heartbeat_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        try:
+            # Our unacked entries become eligible for takeover right away
+            await self.event_bus.clear_heartbeat(self.group_name, self.consumer_name)
+        except Exception as e:
+            logger.warning(f"Could not clear heartbeat for {self.consumer_name}: {e}")
         logger.info("BackgroundWorker stopped")
             
     async def _run_loop(self):
         """Main consumption loop"""
-        logger.info(f"Worker loop starting for stream: {self.stream_name}")
+        logger.info(f"Worker loop starting for streams: {', '.join(self.streams)}")
         while self.running:
             try:
-                # Consume messages
-                await self.event_bus.consume(
-                    stream=self.stream_name,
-                    group=self.group_name,
-                    consumer=self.consumer_name,
-                    handler=self.handle_event,
-                    count=5
-                )
-                await asyncio.sleep(0.1) # Prevent tight loop
+                # Blocking read: Redis holds the call until messages arrive or block_ms elapses
+                if self.concurrency > 1:
+                    await self.event_bus.consume_concurrent(
+                        stream=self.streams,
+                        group=self.group_name,
+                        consumer=self.consumer_name,
+                        handler=self.handle_event,
+                        count=self.batch_size,
+                        block=self.block_ms,
+                        concurrency=self.concurrency,
+                        key=self._partition_key if self.partition_field else None,
+                        should_run=lambda: self.running,
+                        max_deliveries=self.max_deliveries,
+                        dead_letter_suffix=self.dead_letter_suffix
+                    )
+                else:
+                    await self.event_bus.consume_forever(
+                        stream=self.streams,
+                        group=self.group_name,
+                        consumer=self.consumer_name,
+                        handler=self.handle_event,
+                        count=self.batch_size,
+                        block=self.block_ms,
+                        should_run=lambda: self.running
+                    )
             except Exception as e:
                 logger.error(f"Worker loop error: {e}")
                 await asyncio.sleep(1)
 
+    def _partition_key(self, data: Dict[str, Any]) -> Any:
+        """Ordering key for concurrent mode: the configured payload field, if present"""
+        payload = data.get("payload")
+        return payload.get(self.partition_field) if isinstance(payload, dict) else None
+
+    async def _heartbeat_loop(self):
+        """Own task, so long handlers or reclaim passes never make this consumer look dead"""
+        while self.running:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.event_bus.heartbeat(self.group_name, self.consumer_name)
+            except Exception as e:
+                logger.error(f"Heartbeat error: {e}")
+
+    async def _reclaim_loop(self):
+        """Periodically retry orphaned/failed entries and drop dead consumers"""
+        while self.running:
+            await asyncio.sleep(self.reclaim_interval)
+            try:
+                for stream in self.streams:
+                    reclaimed = await self.event_bus.reclaim(
+                        stream=stream,
+                        group=self.group_name,
+                        consumer=self.consumer_name,
+                        handler=self.handle_event,
+                        min_idle_ms=self.reclaim_min_idle_ms,
+                        count=self.batch_size,
+                        max_deliveries=self.max_deliveries,
+                        dead_letter_stream=f"{stream}{self.dead_letter_suffix}",
+                        consumer_timeout_ms=self.consumer_timeout_ms
+                    )
+                    if reclaimed:
+                        logger.info(f"Reclaimed {reclaimed} pending messages on {stream}")
+                    await self.event_bus.prune_consumers(
+                        stream, self.group_name, idle_ms=self.consumer_idle_ms, keep=self.consumer_name
+                    )
+            except Exception as e:
+                logger.error(f"Reclaim loop error: {e}")
+
     async def handle_event(self, msg_id: str, data: Dict[str, Any]):
-        """Process a single event"""
+        """Dispatch a single event to its registered handler"""
+        stream = data.get("stream", "")
         event_type = data.get("type", "UNKNOWN")
-        payload = data.get("payload", {})
         
+        handler = self.registry.get(stream, event_type)
+        if handler is None:
+            logger.debug(f"No handler for {event_type} on {stream} ({msg_id})")
+            return
+            
         logger.info(f"⚡ [WORKER] Processing {event_type} ({msg_id})")
-        
-        if event_type == "SYSTEM_STARTUP":
-            await self.handle_system_startup(payload)
-        elif event_type == "SYSTEM_SHUTDOWN":
-            await self.handle_system_shutdown(payload)
-        elif event_type == "TRIGGER_DEPLOY":
-            logger.info("🚀 Deployment trigger received! Initiating sequence...")
-        
-    async def handle_system_startup(self, payload: Dict):
-        logger.info(f"System Startup Procedure: Verifying payload: {payload}")
-        # Could trigger initial cache warming here
-        
-    async def handle_system_shutdown(self, payload: Dict):
-        logger.info("System Shutdown Procedure: Cleaning up resources...")
+        await asyncio.wait_for(handler(data.get("payload", {})), timeout=self.handler_timeout)
+
+@default_registry.on("system", "SYSTEM_STARTUP")
+async def handle_system_startup(payload: Dict):
+    logger.info(f"System Startup Procedure: Verifying payload: {payload}")
+    # Could trigger initial cache warming here
+
+@default_registry.on("system", "SYSTEM_SHUTDOWN")
+async def handle_system_shutdown(payload: Dict):
+    logger.info("System Shutdown Procedure: Cleaning up resources...")
+
+@default_registry.on("system", "TRIGGER_DEPLOY")
+async def handle_trigger_deploy(payload: Dict):
+    logger.info("🚀 Deployment trigger received! Initiating sequence...")